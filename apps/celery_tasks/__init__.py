@@ -14,4 +14,4 @@ app.autodiscover_tasks()
 
 # Autodiscover tasks in all Django apps that have a 'tasks.py' module
 from .tasks import *
-
+from .publish import deliver_message, publish_message, to_primitive
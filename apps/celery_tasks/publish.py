@@ -0,0 +1,48 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.models import Message
+from .tasks import deliver, fan_out_message, to_primitive
+
+log = logging.getLogger(__file__)
+
+
+def publish_message(message: Message, data: Dict[str, Any],
+                    recipient_ids: List[Any], listener_ids: List[Any]) -> None:
+    """
+        Pushes an already serialized message from the request process.
+
+        Args:
+            message (Message): The stored message.
+            data (Dict[str, Any]): `MessageSerializer` output for it.
+            recipient_ids (List[Any]): Members whose unread counter is bumped.
+            listener_ids (List[Any]): Members the message is pushed to.
+    """
+    deliver(message.id, message.conversation_id, to_primitive(data), recipient_ids, listener_ids,
+            seq=getattr(message, "unread_seq", None))
+
+
+def deliver_message(message: Message, data: Dict[str, Any],
+                    recipient_ids: Iterable[Any], listener_ids: Optional[Iterable[Any]] = None) -> None:
+    """
+        Delivers a new message once the surrounding transaction commits.
+
+        With REALTIME_INLINE_PUBLISH the request publishes itself, unless the
+        room has more than FANOUT_INLINE_MAX listeners; those rooms, and every
+        room when inline publishing is off, are fanned out by one
+        `fan_out_message` task.
+
+        Args:
+            listener_ids (Iterable[Any]): Members to push to, all recipients by default.
+    """
+    recipient_ids = list(recipient_ids)
+    listener_ids = recipient_ids if listener_ids is None else list(listener_ids)
+    if settings.REALTIME_INLINE_PUBLISH and len(listener_ids) <= settings.FANOUT_INLINE_MAX:
+        transaction.on_commit(lambda: publish_message(message, data, recipient_ids, listener_ids))
+        return
+    args = to_primitive([message.id, message.conversation_id, data, recipient_ids, listener_ids])
+    seq = getattr(message, "unread_seq", None)
+    transaction.on_commit(lambda: fan_out_message.delay(*args, seq=seq))
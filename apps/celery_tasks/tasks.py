@@ -1,27 +1,48 @@
 import uuid
 import json
+import asyncio
+import decimal
 import time
 import logging
 import datetime
+from typing import Any, Dict, List, Optional
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from celery import shared_task
 
-from apps.models import Profile, Message
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.models import Profile, Message, Conversation, ChangeLog
 from apps.serializers import MessageSerializer
+from apps.repositories import UnreadCounter
 from services import UserService
 
 log = logging.getLogger(__file__)
 
-def default_converter(o):
-    if isinstance(o, datetime.datetime):
-        return o.isoformat()
-    if isinstance(o, uuid.UUID):  # Convert UUID to string
-        return str(o)
-    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def to_primitive(value: Any) -> Any:
+    """
+        Converts serializer output to plain JSON/msgpack types in one pass.
+
+        Cheaper than a `json.loads(json.dumps(data, default=...))` round trip:
+        UUIDs and decimals become strings, dates ISO 8601 strings, and
+        ReturnDict/OrderedDict/tuples plain dicts and lists.
+    """
+    if isinstance(value, dict):
+        return {key: to_primitive(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_primitive(item) for item in value]
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    return value
+
 
 @shared_task
-def send_messages(message_id: str, user_id: str):
+def send_messages(message_id: str, user_id: str, seq: Optional[int] = None):
     try:
         print("Entering 0")
         try:
@@ -36,20 +57,109 @@ def send_messages(message_id: str, user_id: str):
             raise
 
         serializer = MessageSerializer(message)
-        serialized_data = json.dumps(serializer.data, default=default_converter)
         channel_layer = get_channel_layer()
         async_to_sync(channel_layer.group_send)(
             f'chat_{user.id}',
             {
                 'type': 'parser',
-                'message': json.loads(serialized_data),
+                'message': to_primitive(serializer.data),
             }
         )
         log.info(f"Message sent to chat group: chat_{user.id}")
+        if message.sender_id != user.id:
+            UnreadCounter().increment(user.id, message.conversation_id, seq=seq)
 
     except Message.DoesNotExist:
         log.error(f"Message with ID {message_id} does not exist.")
     except Profile.DoesNotExist:
         log.error(f"User with ID {user_id} does not exist.")
     except Exception as e:
-        log.error(f"Error sending real-time chat message: {e}")
\ No newline at end of file
+        log.error(f"Error sending real-time chat message: {e}")
+
+
+async def fan_out(event: Dict[str, Any], profile_ids: List[Any], chunk_size: int) -> List[Any]:
+    """
+        Sends `event` to the chat group of every profile, `chunk_size` group_sends at a time.
+
+        Returns:
+            List[Any]: The profiles the channel layer couldn't reach.
+    """
+    channel_layer = get_channel_layer()
+    failed = []
+    for start in range(0, len(profile_ids), chunk_size):
+        chunk = profile_ids[start:start + chunk_size]
+        results = await asyncio.gather(
+            *(channel_layer.group_send(f'chat_{profile_id}', event) for profile_id in chunk),
+            return_exceptions=True,
+        )
+        for profile_id, result in zip(chunk, results):
+            if isinstance(result, Exception):
+                log.warning(f"Publish to chat_{profile_id} failed: {result}")
+                failed.append(profile_id)
+    return failed
+
+
+def deliver(message_id: Any, conversation_id: Any, data: Dict[str, Any],
+            recipient_ids: List[Any], listener_ids: List[Any], seq: Optional[int] = None) -> None:
+    """
+        Pushes a serialized message to `listener_ids` and bumps the unread
+        counters of `recipient_ids`.
+
+        Listeners the channel layer couldn't reach get a `send_messages` task,
+        which also counts their unread message. `seq` is the send's
+        `Conversation.message_seq`, see `UnreadCounter`.
+    """
+    failed = async_to_sync(fan_out)(
+        {'type': 'parser', 'message': data}, listener_ids, settings.FANOUT_CHUNK_SIZE,
+    )
+    for profile_id in failed:
+        send_messages.delay(message_id=str(message_id), user_id=str(profile_id), seq=seq)
+    failed = set(failed)
+    UnreadCounter().increment_many(
+        [profile_id for profile_id in recipient_ids if profile_id not in failed], conversation_id, seq=seq,
+    )
+
+
+@shared_task
+def fan_out_message(message_id: str, conversation_id: str, data: Dict[str, Any],
+                    recipient_ids: List[str], listener_ids: List[str], seq: Optional[int] = None):
+    """Delivers a message to a room too large to fan out from the request."""
+    deliver(message_id, conversation_id, data, recipient_ids, listener_ids, seq=seq)
+    log.info(f"Message {message_id} fanned out to {len(listener_ids)} of {len(recipient_ids)} members")
+
+
+@shared_task
+def send_reaction(event: Dict[str, Any]):
+    """Sends a reaction delta (see `ReactionRepo.event`) to every member of its conversation."""
+    profile_ids = Conversation.profiles.through.objects.filter(
+        conversation_id=event["conversation"],
+    ).values_list("profile_id", flat=True)
+    channel_layer = get_channel_layer()
+    for profile_id in profile_ids:
+        try:
+            async_to_sync(channel_layer.group_send)(
+                f'chat_{profile_id}',
+                {
+                    'type': 'reaction',
+                    'message': event,
+                }
+            )
+        except Exception as e:
+            log.error(f"Error sending reaction to chat_{profile_id}: {e}")
+
+
+@shared_task
+def prune_changelog():
+    """Drops change rows past SYNC_CHANGELOG_RETENTION_DAYS, always keeping the newest ones."""
+    cutoff = timezone.now() - datetime.timedelta(days=settings.SYNC_CHANGELOG_RETENTION_DAYS)
+    position = ChangeLog.position_field()
+    latest = ChangeLog.objects.filter(**{f"{position}__isnull": False}).order_by(
+        f"-{position}",
+    ).values_list(position, flat=True).first()
+    if latest is None:
+        return
+    deleted, _ = ChangeLog.objects.filter(
+        Q(**{f"{position}__lt": latest}) | Q(**{f"{position}__isnull": True}),
+        created_at__lt=cutoff,
+    ).delete()
+    log.info(f"Pruned {deleted} change log rows older than {cutoff:%Y-%m-%d}")
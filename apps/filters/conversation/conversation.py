@@ -1,28 +1,19 @@
 import logging
 import django_filters
 from django_filters import rest_framework as filters
-from apps.models import Conversation, Request
-from django.db.models import Q
+from apps.models import Conversation
 
 log = logging.getLogger(__file__)
 class ConversationFilter(django_filters.FilterSet):
     request_status = filters.CharFilter(method='filter_request_status')
 
     def filter_request_status(self, queryset, name, value):
-        user = self.request.user
+        # `request_status` is annotated by ConversationRepo.for_profile from
+        # the caller's inbox entry.
         statuses = value.split('|') if value else []
-
-        requests = Request.objects.filter(
-            Q(sender=user) | Q(receiver=user),
-            status__in=statuses
-        )
-        
-        sender_profiles = requests.values_list('sender', flat=True)
-        receiver_profiles = requests.values_list('receiver', flat=True)
-
-        related_profiles = sender_profiles.union(receiver_profiles)
-        conversations = queryset.filter(profiles__in=related_profiles)
-        return conversations.distinct()
+        if not statuses:
+            return queryset
+        return queryset.filter(request_status__in=statuses)
 
     class Meta:
         model = Conversation
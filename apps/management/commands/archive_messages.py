@@ -0,0 +1,116 @@
+import datetime
+from typing import List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from apps.models import InboxEntry, Message, MessageArchive
+
+
+def month_start(value: datetime.datetime) -> datetime.datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value: datetime.datetime) -> datetime.datetime:
+    return (value.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the monthly MessageArchive partitions and moves messages older than "
+        "MESSAGE_ARCHIVE_AFTER_DAYS out of the hot Message table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=settings.MESSAGE_ARCHIVE_AFTER_DAYS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--future-months", type=int, default=3,
+                            help="Partitions to create ahead of the current archive cutoff.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options["older_than_days"])
+        oldest = Message.objects.order_by("created_at").values_list("created_at", flat=True).first()
+        if connection.vendor == "postgresql":
+            start = month_start(oldest) if oldest and oldest < cutoff else month_start(cutoff)
+            end = month_start(cutoff)
+            for _ in range(options["future_months"] + 1):
+                end = next_month(end)
+            self.create_partitions(start, end, options["dry_run"])
+
+        candidates = self.archivable(cutoff)
+        if options["dry_run"]:
+            self.stdout.write(f"{candidates.count()} messages older than {cutoff:%Y-%m-%d} would be archived.")
+            return
+
+        moved = 0
+        while True:
+            with transaction.atomic():
+                # Newest first: replies and forwards are moved before the messages
+                # they point at, so deleting those never nulls a link still to archive.
+                batch = list(
+                    candidates.order_by("-created_at", "-id").prefetch_related("file")[:options["batch_size"]]
+                )
+                if not batch:
+                    break
+                self.archive(batch)
+            moved += len(batch)
+            self.stdout.write(f"archived {moved} messages")
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} messages older than {cutoff:%Y-%m-%d}."))
+
+    def create_partitions(self, start: datetime.datetime, end: datetime.datetime, dry_run: bool) -> None:
+        """One partition per month in [start, end); existing ones are left alone."""
+        month = start
+        with connection.cursor() as cursor:
+            while month < end:
+                following = next_month(month)
+                sql = (
+                    f"CREATE TABLE IF NOT EXISTS apps_messagearchive_p{month:%Y%m} "
+                    f"PARTITION OF apps_messagearchive "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+                )
+                if dry_run:
+                    self.stdout.write(sql)
+                else:
+                    cursor.execute(sql)
+                month = following
+
+    @staticmethod
+    def archivable(cutoff: datetime.datetime):
+        """
+            Messages older than `cutoff` that nothing hot still points at.
+
+            Messages replied to or forwarded from by newer messages, and inbox
+            last messages, stay in the hot table so those links keep working.
+        """
+        newer = Message.objects.filter(created_at__gte=cutoff)
+        return Message.objects.filter(created_at__lt=cutoff).exclude(
+            Exists(newer.filter(Q(parent=OuterRef("pk")) | Q(forwarded_from=OuterRef("pk"))))
+        ).exclude(
+            Exists(InboxEntry.objects.filter(last_message=OuterRef("pk")))
+        )
+
+    @staticmethod
+    def archive(batch: List[Message]) -> None:
+        ids = [message.id for message in batch]
+        MessageArchive.objects.bulk_create([
+            MessageArchive(
+                id=message.id,
+                created_at=message.created_at,
+                updated_at=message.updated_at,
+                is_active=message.is_active,
+                conversation_id=message.conversation_id,
+                sender_id=message.sender_id,
+                parent_id=message.parent_id,
+                forwarded_from_id=message.forwarded_from_id,
+                content=message.content,
+                is_forwarded=message.is_forwarded,
+                file_ids=[str(attachment.id) for attachment in message.file.all()],
+                reaction_summary=message.reaction_summary,
+            )
+            for message in batch
+        ])
+        Message.objects.filter(id__in=ids).delete()
@@ -0,0 +1,83 @@
+import statistics
+import time
+from typing import Callable, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.models import Conversation, Message, Profile
+from apps.utils.pagination import KeysetPagination
+
+
+class Command(BaseCommand):
+    help = (
+        "Times one message history page at increasing depths of a --rows message "
+        "conversation, with LIMIT/OFFSET and with the KeysetPagination cursor. The "
+        "conversation is seeded on the first run and reused afterwards: run it "
+        "against a development database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", required=True, help="Email of the reading profile.")
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--depths", default="0,1000,10000,50000,99000",
+                            help="Comma separated numbers of newer rows to skip.")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per page, the median is reported.")
+
+    def handle(self, *args, **options):
+        try:
+            profile = Profile.objects.get(email=options["profile"])
+        except Profile.DoesNotExist:
+            raise CommandError(f"No profile with email {options['profile']}.")
+        try:
+            depths = [int(depth) for depth in options["depths"].split(",")]
+        except ValueError:
+            raise CommandError("--depths takes comma separated integers.")
+        if max(depths) >= options["rows"]:
+            raise CommandError("Every depth must be smaller than --rows.")
+
+        conversation = self.get_conversation(profile, options["rows"])
+        # The MessageViewset queryset, narrowed to one conversation.
+        messages = Message.objects.filter(
+            is_active=True, conversation__profiles__in=[profile], conversation=conversation,
+        ).order_by("-created_at", "-id")
+        paginator = KeysetPagination()
+        paginator.fields = ["created_at", "id"]
+        size = options["page_size"]
+
+        for depth in depths:
+            offset = self.median(lambda: list(messages[depth:depth + size]), options["repeat"])
+            if depth:
+                anchor = messages[depth - 1]
+                page = messages.filter(paginator.keyset_filter([anchor.created_at, anchor.id], newer=False))
+            else:
+                page = messages
+            cursor = self.median(lambda: list(page[:size]), options["repeat"])
+            self.stdout.write(f"depth {depth:>7}: offset {offset:8.2f} ms, cursor {cursor:6.2f} ms")
+
+    def get_conversation(self, profile: Profile, rows: int) -> Conversation:
+        name = f"history-{rows}"
+        conversation = Conversation.objects.filter(name=name, profiles=profile).first()
+        if conversation is not None:
+            return conversation
+
+        self.stdout.write(f"Seeding {rows} messages into {name}...")
+        conversation = Conversation.objects.create(name=name, room_type=Conversation.GROUP, approved=True)
+        conversation.profiles.add(profile)
+        conversation.save()
+        batch = 5000
+        for start in range(0, rows, batch):
+            Message.objects.bulk_create([
+                Message(conversation=conversation, sender=profile, content=f"history {index}")
+                for index in range(start, min(start + batch, rows))
+            ])
+        return conversation
+
+    @staticmethod
+    def median(run: Callable[[], List], repeat: int) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import statistics
+import time
+from typing import List
+
+from asgiref.sync import async_to_sync
+from channels.layers import channel_layers, get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.models import Conversation, Message, Profile
+from apps.serializers import MessageSerializer
+from apps.views import MessageViewset
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends messages through the message API and measures how long the receiver's "
+        "chat group takes to get each one. Sends real messages: run it against a "
+        "development database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", help="Email of the sending profile.")
+        parser.add_argument("--count", type=int, default=100, help="Messages to send.")
+        parser.add_argument("--timeout", type=float, default=5.0,
+                            help="Seconds to wait for a message to reach the receiver.")
+        parser.add_argument("--in-memory-layer", action="store_true",
+                            help="Use InMemoryChannelLayer instead of the configured channel layer.")
+
+    def handle(self, *args, **options):
+        sender = self.get_profile(options.get("profile"))
+        conversation = (
+            Conversation.objects.filter(profiles=sender, room_type=Conversation.PRIVATE, approved=True)
+            .exclude(pair_key=None).first()
+        )
+        if conversation is None:
+            raise CommandError("The profile needs an approved private conversation.")
+        receiver = conversation.profiles.exclude(id=sender.id).get()
+
+        if options["in_memory_layer"]:
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+                channel_layers.backends.clear()
+                try:
+                    self.run(sender, receiver, conversation, options)
+                finally:
+                    channel_layers.backends.clear()
+        else:
+            self.run(sender, receiver, conversation, options)
+
+    def get_profile(self, email) -> Profile:
+        profiles = Profile.objects.all()
+        if email:
+            profiles = profiles.filter(email=email)
+        profile = profiles.annotate(entries=Count("inbox_entries")).order_by("-entries").first()
+        if profile is None:
+            raise CommandError("No profile found, seed the database first.")
+        return profile
+
+    def run(self, sender: Profile, receiver: Profile, conversation: Conversation, options) -> None:
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"chat_{receiver.id}", channel)
+
+        view = MessageViewset.as_view({"post": "create"})
+        factory = APIRequestFactory()
+        latencies, message_ids = [], []
+        try:
+            for index in range(options["count"]):
+                request = factory.post("/message/", {
+                    "conversation": str(conversation.id),
+                    "content": f"latency probe {index}",
+                }, format="json")
+                force_authenticate(request, user=sender)
+                start = time.perf_counter()
+                response = view(request)
+                if response.status_code != 201:
+                    raise CommandError(f"Send failed with {response.status_code}: {response.data}")
+                event = async_to_sync(self.receive)(layer, channel, options["timeout"])
+                latencies.append((time.perf_counter() - start) * 1000)
+                if event["message"]["id"] != response.data["id"]:
+                    raise CommandError(f"Expected message {response.data['id']}, got {event['message']['id']}.")
+                message_ids.append(response.data["id"])
+        finally:
+            async_to_sync(layer.group_discard)(f"chat_{receiver.id}", channel)
+
+        self.report("send -> receive", latencies)
+        self.report("worker body of the Celery path, broker excluded", self.task_body(message_ids, receiver))
+
+    @staticmethod
+    async def receive(layer, channel: str, timeout: float):
+        try:
+            return await asyncio.wait_for(layer.receive(channel), timeout)
+        except asyncio.TimeoutError:
+            raise CommandError(f"No message reached the receiver within {timeout}s.")
+
+    @staticmethod
+    def task_body(message_ids: List[str], receiver: Profile) -> List[float]:
+        """What a `send_messages` task redid per message before publishing: refetch, serialize, JSON round trip."""
+        timings = []
+        for message_id in message_ids:
+            start = time.perf_counter()
+            message = Message.objects.get(id=message_id)
+            Profile.objects.get(id=receiver.id)
+            json.loads(json.dumps(MessageSerializer(message).data, default=str))
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def report(self, name: str, samples: List[float]) -> None:
+        self.stdout.write(
+            f"{name}: median {statistics.median(samples):.2f} ms, p95 {percentile(samples, 0.95):.2f} ms, "
+            f"max {max(samples):.2f} ms over {len(samples)} messages"
+        )
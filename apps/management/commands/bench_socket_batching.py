@@ -0,0 +1,112 @@
+import asyncio
+import json
+import time
+from typing import Tuple
+
+from channels.layers import channel_layers, get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from apps.models import Profile
+from websockets.sockets import SocketConsumer
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer", "CONFIG": {"capacity": 100000}}}
+
+# Roughly the size of a serialized chat message
+MESSAGE = {
+    "id": "5b0c0e6c-8a55-4d2a-9f4e-3c3f0d7e2a11",
+    "conversation": "1f2e5a9c-2b7d-4c1e-9a3f-6d8e7f0a1b2c",
+    "sender": {"id": "0c9d8e7f-6a5b-4c3d-2e1f-0a9b8c7d6e5f", "first_name": "Someone"},
+    "content": "hello there " * 8,
+    "created_at": "2026-10-18T10:00:00Z",
+    "reaction_summary": [],
+    "reply_count": 0,
+}
+
+
+class BenchConsumer(SocketConsumer):
+    """SocketConsumer authenticated as `scope["profile"]`, so no token or user service is needed."""
+
+    async def authenticate_user(self, token):
+        self.user = self.scope["user"] = self.scope["profile"]
+        return self.user
+
+    async def connect(self):
+        try:
+            await super().connect()
+        finally:
+            self.scope["connected"].set()
+
+    async def online_users(self, event):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Pushes --events chat events through the channel layer to one SocketConsumer "
+        "and reports events and frames per second, without batching, with `?batch=1`, "
+        "and with batching plus bypassing typing events mixed in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", help="Email of the receiving profile, any profile by default.")
+        parser.add_argument("--events", type=int, default=20000)
+        parser.add_argument("--typing-every", type=int, default=10,
+                            help="In the mixed run, every n-th event is a typing event.")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per mode, the fastest is reported.")
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.all()
+        if options["profile"]:
+            profiles = profiles.filter(email=options["profile"])
+        profile = profiles.first()
+        if profile is None:
+            raise CommandError("No profile found, seed the database first.")
+
+        with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+            channel_layers.backends.clear()
+            try:
+                for name, batch, typing_every in [
+                    ("unbatched", False, 0),
+                    ("batched", True, 0),
+                    (f"batched, 1/{options['typing_every']} typing", True, options["typing_every"]),
+                ]:
+                    frames, events, elapsed = min(
+                        (asyncio.run(self.run(profile, batch, options["events"], typing_every))
+                         for _ in range(options["repeat"])),
+                        key=lambda result: result[2],
+                    )
+                    self.stdout.write(
+                        f"{name}: {events / elapsed:,.0f} events/sec, {frames / elapsed:,.0f} frames/sec, "
+                        f"{events / frames:.1f} events per frame"
+                    )
+            finally:
+                channel_layers.backends.clear()
+
+    @staticmethod
+    async def run(profile: Profile, batch: bool, count: int, typing_every: int) -> Tuple[int, int, float]:
+        """Returns the frames received, the events they carried and the seconds it took."""
+        communicator = WebsocketCommunicator(BenchConsumer.as_asgi(), "/ws/socket/" + ("?batch=1" if batch else ""))
+        communicator.scope.update(profile=profile, connected=asyncio.Event())
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise CommandError("The websocket connect was refused.")
+        await communicator.scope["connected"].wait()
+
+        layer = get_channel_layer()
+        group = f"chat_{profile.id}"
+        start = time.perf_counter()
+        for index in range(count):
+            if typing_every and index % typing_every == 0:
+                await layer.group_send(group, {"type": "receive_typing", "message": {"conversation": MESSAGE["conversation"]}})
+            else:
+                await layer.group_send(group, {"type": "parser", "message": MESSAGE})
+        frames = events = 0
+        while events < count:
+            data = json.loads(await communicator.receive_from(timeout=5))
+            frames += 1
+            events += len(data) if isinstance(data, list) else 1
+        elapsed = time.perf_counter() - start
+        await communicator.disconnect()
+        return frames, events, elapsed
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from channels.db import database_sync_to_async
+from channels.layers import channel_layers
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.utils.permissions.tokens import profile_cache, resolve_profile
+from websockets.sockets import SocketConsumer
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class BenchConsumer(SocketConsumer):
+    """
+        SocketConsumer as routed, telling the benchmark when connect() is done.
+
+        connect() accepts before it authenticates, so the accept frame doesn't
+        mark the end of a connect. Its disconnect broadcasts `online_users`,
+        which it has no handler for; that is ignored so closing one connection
+        doesn't take the others down.
+    """
+
+    async def connect(self):
+        try:
+            await super().connect()
+        finally:
+            self.scope["connected"].set()
+
+    async def online_users(self, event):
+        pass
+
+
+class SyncAuthConsumer(BenchConsumer):
+    """The previous connect path: the user service is called from the sync thread."""
+
+    async def authenticate_user(self, token):
+        self.user = await database_sync_to_async(resolve_profile)(token)
+        self.scope["user"] = self.user
+        return self.user
+
+
+class StubUserService(BaseHTTPRequestHandler):
+    """Answers `current-profile` for the tokens in `server.users`, after `server.delay` seconds."""
+
+    def do_GET(self):
+        token = self.headers.get("Authorization", "").split(" ")[-1]
+        user = self.server.users.get(token)
+        time.sleep(self.server.delay)
+        body = json.dumps(user).encode("utf-8")
+        self.send_response(200 if user else 401)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens --connections websockets against SocketConsumer, each with a token "
+        "nobody has resolved yet, and reports connects/sec with the asyncio user "
+        "service client and with the previous thread-bound one. The user service "
+        "is a local stub answering after --service-delay-ms. Creates one profile "
+        "per connection: run it against a development database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=100, help="Connects in flight at once.")
+        parser.add_argument("--service-delay-ms", type=float, default=20.0,
+                            help="Latency of the stubbed user service.")
+        parser.add_argument("--in-memory-layer", action="store_true",
+                            help="Use InMemoryChannelLayer instead of the configured channel layer.")
+        parser.add_argument("--local-cache", action="store_true",
+                            help="Use a local-memory cache instead of the configured shared cache.")
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubUserService)
+        server.daemon_threads = True
+        server.delay = options["service_delay_ms"] / 1000
+        server.users = {}
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        overrides = {"BASE_URL": f"http://127.0.0.1:{server.server_address[1]}"}
+        if options["in_memory_layer"]:
+            overrides["CHANNEL_LAYERS"] = IN_MEMORY_LAYER
+        if options["local_cache"]:
+            overrides["CACHES"] = LOCAL_CACHE
+        try:
+            with override_settings(**overrides):
+                channel_layers.backends.clear()
+                for offset, (name, consumer) in enumerate([("asyncio client", BenchConsumer),
+                                                           ("sync thread", SyncAuthConsumer)]):
+                    tokens = self.issue_tokens(server.users, offset * options["connections"], options["connections"])
+                    profile_cache.clear()
+                    latencies, elapsed = asyncio.run(self.connect_all(consumer, tokens, options["concurrency"]))
+                    self.stdout.write(
+                        f"{name}: {len(tokens) / elapsed:.0f} connects/sec, "
+                        f"median {statistics.median(latencies):.1f} ms, "
+                        f"p95 {sorted(latencies)[int(len(latencies) * 0.95)]:.1f} ms per connect"
+                    )
+        finally:
+            channel_layers.backends.clear()
+            server.shutdown()
+            server.server_close()
+
+    @staticmethod
+    def issue_tokens(users: Dict[str, Dict], start: int, count: int) -> List[str]:
+        tokens = []
+        for index in range(start, start + count):
+            token = AccessToken()
+            token["user_id"] = index
+            token = str(token)
+            users[token] = {
+                "id": index,
+                "first_name": "bench",
+                "last_name": str(index),
+                "email": f"bench-connect-{index}@example.com",
+                "username": f"bench-connect-{index}",
+            }
+            tokens.append(token)
+        return tokens
+
+    async def connect_all(self, consumer, tokens: List[str], concurrency: int):
+        application = consumer.as_asgi()
+        slots = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def connect(token: str) -> WebsocketCommunicator:
+            async with slots:
+                communicator = WebsocketCommunicator(application, f"/ws/socket/?token={token}")
+                communicator.scope["connected"] = asyncio.Event()
+                start = time.perf_counter()
+                connected, _ = await communicator.connect(timeout=30)
+                if not connected:
+                    raise CommandError("A websocket connect was refused.")
+                await communicator.scope["connected"].wait()
+                latencies.append((time.perf_counter() - start) * 1000)
+                return communicator
+
+        start = time.perf_counter()
+        communicators = await asyncio.gather(*(connect(token) for token in tokens))
+        elapsed = time.perf_counter() - start
+        for communicator in communicators:
+            await communicator.disconnect()
+        return latencies, elapsed
@@ -0,0 +1,112 @@
+import re
+from typing import List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q, QuerySet
+
+from apps.models import (Conversation, ConversationSettings, InboxEntry, Message,
+                         MessageReact, Profile, Request, make_pair_key)
+from apps.repositories import ChangeFeed, ConversationRepo
+from apps.utils.utils import friend_ids
+
+SQLITE_SCAN = re.compile(r"\bSCAN (?!CONSTANT\b)(\w+)\b(?! USING)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the chat hot-path queries for a seeded profile and exits "
+        "with status 1 if any of them needs a sequential scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", help="Email of the profile to build the queries for.")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print every plan.")
+
+    def handle(self, *args, **options):
+        profile = self.get_profile(options.get("profile"))
+        conversation = (
+            Conversation.objects.filter(inbox_entries__profile=profile, room_type=Conversation.PRIVATE)
+            .exclude(pair_key=None).first()
+        )
+        if conversation is None:
+            raise CommandError("The profile needs at least one private conversation with a pair key.")
+        other = conversation.profiles.exclude(id=profile.id).first()
+
+        failures = []
+        for name, queryset in self.hot_queries(profile, conversation, other):
+            plan = self.explain(queryset)
+            scans = self.sequential_scans(plan)
+            if options["verbose_plans"] or scans:
+                self.stdout.write(f"-- {name}\n{plan}\n")
+            if scans:
+                failures.append(f"{name}: {', '.join(scans)}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {name}"))
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(self.style.ERROR(f"seq  {failure}"))
+            raise CommandError(f"{len(failures)} hot queries fall back to a sequential scan.")
+
+    def get_profile(self, email) -> Profile:
+        profiles = Profile.objects.all()
+        if email:
+            profiles = profiles.filter(email=email)
+        profile = profiles.annotate(entries=Count("inbox_entries")).order_by("-entries").first()
+        if profile is None:
+            raise CommandError("No profile found, seed the database first.")
+        return profile
+
+    @staticmethod
+    def hot_queries(profile: Profile, conversation: Conversation, other: Profile) -> List[Tuple[str, QuerySet]]:
+        """The queries of apps/views/chat.py and apps/serializers that run on every request."""
+        key = make_pair_key(profile.id, other.id)
+        return [
+            ("inbox page", ConversationRepo().for_profile(profile)[:20]),
+            ("message page", Message.objects.filter(
+                conversation=conversation, is_active=True,
+            ).order_by("-created_at", "-id")[:20]),
+            ("last message", conversation.messages.filter(is_active=True).order_by("-created_at")[:1]),
+            ("unread messages", conversation.messages.filter(
+                is_active=True, created_at__gt=conversation.created_at,
+            ).exclude(sender=profile)),
+            ("already sent", Message.objects.filter(sender=profile, conversation=conversation)[:1]),
+            ("inbox entry", InboxEntry.objects.filter(conversation=conversation, profile=profile)),
+            ("pair request", Request.objects.filter(pair_key=key)),
+            ("private conversation", Conversation.objects.filter(pair_key=key)),
+            ("pending requests", Request.objects.filter(
+                Q(sender=profile) | Q(receiver=profile),
+                Q(status="pending") | Q(status="hidden"),
+                is_active=True,
+            ).order_by("-created_at")),
+            ("mutual friends", friend_ids(profile.id).filter(friend_id__in=friend_ids(other.id))[:1]),
+            ("conversation settings", ConversationSettings.objects.filter(
+                is_active=True, profile=profile,
+            ).order_by("-created_at")),
+            ("thread level", Message.objects.filter(
+                parent_id__in=conversation.messages.values("id")[:1], is_active=True,
+            ).order_by("created_at", "id")[:settings.THREAD_MAX_SIZE]),
+            ("sync feed", ChangeFeed(profile).changes(0, ChangeFeed.horizon())[:ChangeFeed.default_limit]),
+            ("reaction summary refresh", MessageReact.summary_rows(
+                conversation.messages.filter(is_active=True).order_by("-created_at").values("id")[:1],
+            )),
+        ]
+
+    @staticmethod
+    def explain(queryset: QuerySet) -> str:
+        if connection.vendor != "postgresql":
+            return queryset.explain()
+        # On a small seed the planner prefers a seq scan even where an index
+        # exists; disabling it only leaves seq scans that have no alternative.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            return queryset.explain()
+
+    @staticmethod
+    def sequential_scans(plan: str) -> List[str]:
+        if connection.vendor == "postgresql":
+            return re.findall(r"Seq Scan on (\w+)", plan)
+        return SQLITE_SCAN.findall(plan)
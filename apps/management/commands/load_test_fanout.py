@@ -0,0 +1,160 @@
+import asyncio
+import time
+from typing import Dict, List
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, channel_layers, get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.models import Conversation, ConversationSettings, Profile
+from apps.views import MessageViewset
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "apps.management.commands.load_test_fanout.LoadTestChannelLayer"}}
+
+
+class LoadTestChannelLayer(InMemoryChannelLayer):
+    """
+        InMemoryChannelLayer without the expiry sweep it runs on every
+        group_send. The sweep walks every channel and group, so a fan-out to
+        thousands of members would mostly time the sweep. Nothing expires
+        within one run.
+    """
+
+    def _clean_expired(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends a message to a group room of --members synthetic profiles, some of them "
+        "muted or blocked, once per fan-out chunk size, and checks that exactly the "
+        "listeners got it. The room is created on the first run and reused afterwards: "
+        "run it against a development database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", required=True, help="Email of the sending profile.")
+        parser.add_argument("--members", type=int, default=5000)
+        parser.add_argument("--chunk-sizes", default="1,100,500",
+                            help="Comma separated FANOUT_CHUNK_SIZE values to send with.")
+        parser.add_argument("--muted-every", type=int, default=10, help="Every n-th member mutes the room.")
+        parser.add_argument("--blocked-every", type=int, default=25, help="Every n-th member blocks the room.")
+        parser.add_argument("--timeout", type=float, default=5.0,
+                            help="Seconds to wait for the listeners to get a message.")
+        parser.add_argument("--in-memory-layer", action="store_true",
+                            help="Use an in-process channel layer instead of the configured one.")
+
+    def handle(self, *args, **options):
+        try:
+            sender = Profile.objects.get(email=options["profile"])
+        except Profile.DoesNotExist:
+            raise CommandError(f"No profile with email {options['profile']}.")
+        try:
+            chunk_sizes = [int(size) for size in options["chunk_sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--chunk-sizes takes comma separated integers.")
+        conversation = self.get_room(sender, options)
+
+        if options["in_memory_layer"]:
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+                channel_layers.backends.clear()
+                try:
+                    self.run(sender, conversation, chunk_sizes, options)
+                finally:
+                    channel_layers.backends.clear()
+        else:
+            self.run(sender, conversation, chunk_sizes, options)
+
+    def get_room(self, sender: Profile, options) -> Conversation:
+        members = options["members"]
+        name = f"load-{members}"
+        conversation = Conversation.objects.filter(name=name, room_type=Conversation.GROUP).first()
+        if conversation is not None:
+            return conversation
+
+        self.stdout.write(f"Creating room {name}...")
+        profiles = Profile.objects.bulk_create([
+            Profile(user_id=f"{name}-{index}", first_name=f"member{index}", email=f"{name}-{index}@example.com")
+            for index in range(members)
+        ])
+        conversation = Conversation.objects.create(name=name, room_type=Conversation.GROUP, approved=True)
+        conversation.profiles.add(sender, *profiles)
+        conversation.save()
+        silenced = {
+            profile.id: (index % options["muted_every"] == 0, index % options["blocked_every"] == 1)
+            for index, profile in enumerate(profiles)
+            if index % options["muted_every"] == 0 or index % options["blocked_every"] == 1
+        }
+        for settings in ConversationSettings.objects.filter(conversation=conversation, profile_id__in=silenced):
+            settings.is_muted, settings.is_blocked = silenced[settings.profile_id]
+            settings.save()
+        return conversation
+
+    def run(self, sender: Profile, conversation: Conversation, chunk_sizes: List[int], options) -> None:
+        silenced = set(
+            ConversationSettings.objects.filter(conversation=conversation)
+            .exclude(is_muted=False, is_blocked=False).values_list("profile_id", flat=True)
+        )
+        member_ids = list(conversation.profiles.exclude(id=sender.id).values_list("id", flat=True))
+        listener_ids = {profile_id for profile_id in member_ids if profile_id not in silenced}
+
+        layer = get_channel_layer()
+        channels = async_to_sync(self.subscribe)(layer, member_ids)
+        view = MessageViewset.as_view({"post": "create"})
+        factory = APIRequestFactory()
+        try:
+            for chunk_size in chunk_sizes:
+                request = factory.post("/message/", {
+                    "conversation": str(conversation.id),
+                    "content": f"load test, chunks of {chunk_size}",
+                }, format="json")
+                force_authenticate(request, user=sender)
+                # Publish from the request so the fan-out itself is timed.
+                with override_settings(FANOUT_CHUNK_SIZE=chunk_size, FANOUT_INLINE_MAX=len(member_ids),
+                                       REALTIME_INLINE_PUBLISH=True), \
+                        CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = view(request)
+                    elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code != 201:
+                    raise CommandError(f"Send failed with {response.status_code}: {response.data}")
+
+                reached = async_to_sync(self.collect)(layer, channels, options["timeout"])
+                self.stdout.write(
+                    f"chunk size {chunk_size}: send and fan-out {elapsed:.0f} ms, {len(queries)} queries, "
+                    f"pushed to {len(reached)} of {len(member_ids)} members ({len(listener_ids)} listeners)"
+                )
+                if reached != listener_ids:
+                    raise CommandError(
+                        f"{len(listener_ids - reached)} listeners missed the message, "
+                        f"{len(reached - listener_ids)} muted or blocked members got it."
+                    )
+        finally:
+            async_to_sync(self.unsubscribe)(layer, channels)
+
+    @staticmethod
+    async def subscribe(layer, member_ids: List) -> Dict:
+        channels = {}
+        for profile_id in member_ids:
+            channels[profile_id] = await layer.new_channel()
+            await layer.group_add(f"chat_{profile_id}", channels[profile_id])
+        return channels
+
+    @staticmethod
+    async def unsubscribe(layer, channels: Dict) -> None:
+        for profile_id, channel in channels.items():
+            await layer.group_discard(f"chat_{profile_id}", channel)
+
+    @staticmethod
+    async def collect(layer, channels: Dict, timeout: float) -> set:
+        """Members whose channel got an event within `timeout` seconds."""
+        pending = {asyncio.ensure_future(layer.receive(channel)): profile_id
+                   for profile_id, channel in channels.items()}
+        done, not_done = await asyncio.wait(pending, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        await asyncio.gather(*not_done, return_exceptions=True)
+        return {pending[task] for task in done if not task.exception()}
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:22
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def backfill_inbox_entries(apps, schema_editor):
+    Conversation = apps.get_model("apps", "Conversation")
+    ConversationSettings = apps.get_model("apps", "ConversationSettings")
+    InboxEntry = apps.get_model("apps", "InboxEntry")
+    Message = apps.get_model("apps", "Message")
+    Request = apps.get_model("apps", "Request")
+
+    for conversation in Conversation.objects.prefetch_related("profiles").iterator(chunk_size=500):
+        member_ids = [profile.id for profile in conversation.profiles.all()]
+        if not member_ids:
+            continue
+        messages = Message.objects.filter(conversation=conversation, is_active=True)
+        last_message = messages.order_by("-created_at").first()
+        settings = {
+            item.profile_id: item
+            for item in ConversationSettings.objects.filter(conversation=conversation)
+        }
+        entries = []
+        for profile_id in member_ids:
+            others = [other_id for other_id in member_ids if other_id != profile_id]
+            request_status = None
+            if conversation.room_type == "private" and len(others) == 1:
+                request_status = Request.objects.filter(
+                    Q(sender_id=profile_id, receiver_id=others[0]) |
+                    Q(sender_id=others[0], receiver_id=profile_id)
+                ).order_by("-created_at").values_list("status", flat=True).first()
+            item = settings.get(profile_id)
+            entries.append(InboxEntry(
+                profile_id=profile_id,
+                conversation=conversation,
+                last_message=last_message,
+                last_activity_at=last_message.created_at if last_message else conversation.created_at,
+                unread_count=messages.filter(is_read=False).exclude(sender_id=profile_id).count(),
+                is_muted=bool(item and item.is_muted),
+                is_blocked=bool(item and item.is_blocked),
+                is_trashed=bool(item and item.is_trashed),
+                request_status=request_status,
+            ))
+        InboxEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0005_profile_is_private_alter_request_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('last_activity_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('is_muted', models.BooleanField(default=False)),
+                ('is_blocked', models.BooleanField(default=False)),
+                ('is_trashed', models.BooleanField(default=False)),
+                ('request_status', models.CharField(blank=True, max_length=10, null=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='apps.conversation')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='apps.message')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='apps.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile', '-last_activity_at'], name='inbox_profile_activity_idx')],
+                'unique_together': {('profile', 'conversation')},
+            },
+        ),
+        migrations.RunPython(backfill_inbox_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:27
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def make_pair_key(profile_id, other_id):
+    return ":".join(sorted([str(profile_id), str(other_id)]))
+
+
+def backfill_pair_keys(apps, schema_editor):
+    """
+        Keys the latest request and the oldest private conversation of every pair.
+
+        Older duplicates keep a NULL key, so they stay in the tables but are no
+        longer returned by pair lookups.
+    """
+    Conversation = apps.get_model("apps", "Conversation")
+    Request = apps.get_model("apps", "Request")
+
+    seen = set()
+    requests = []
+    for request in Request.objects.order_by("-created_at").only("id", "sender_id", "receiver_id").iterator(chunk_size=2000):
+        key = make_pair_key(request.sender_id, request.receiver_id)
+        if key in seen:
+            continue
+        seen.add(key)
+        request.pair_key = key
+        requests.append(request)
+    Request.objects.bulk_update(requests, ["pair_key"], batch_size=1000)
+
+    members = defaultdict(list)
+    through = Conversation.profiles.through.objects.filter(conversation__room_type="private")
+    for conversation_id, profile_id in through.values_list("conversation_id", "profile_id").iterator(chunk_size=2000):
+        members[conversation_id].append(profile_id)
+
+    seen = set()
+    conversations = []
+    for conversation in Conversation.objects.filter(id__in=members).order_by("created_at").only("id"):
+        member_ids = members[conversation.id]
+        if len(member_ids) != 2:
+            continue
+        key = make_pair_key(*member_ids)
+        if key in seen:
+            continue
+        seen.add(key)
+        conversation.pair_key = key
+        conversations.append(conversation)
+    Conversation.objects.bulk_update(conversations, ["pair_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0006_inboxentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='pair_key',
+            field=models.CharField(blank=True, editable=False, max_length=73, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='pair_key',
+            field=models.CharField(blank=True, editable=False, max_length=73, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_pair_keys, migrations.RunPython.noop),
+    ]
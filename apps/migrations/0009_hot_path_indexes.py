@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0008_request_status_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversationsettings',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['profile', '-created_at'], name='settings_profile_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['conversation', '-created_at', '-id'], name='message_conv_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['conversation', 'sender'], name='message_conv_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'conversation'], name='message_sender_conv_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_read_watermarks(apps, schema_editor):
+    """
+        Derives each member's watermark from the per-message is_read flags.
+
+        A member who has no unread message from the others has read the whole
+        conversation; otherwise the watermark is the newest message of the
+        others that was marked read.
+    """
+    InboxEntry = apps.get_model("apps", "InboxEntry")
+    Message = apps.get_model("apps", "Message")
+
+    entries = []
+    for entry in InboxEntry.objects.only("id", "profile_id", "conversation_id").iterator(chunk_size=500):
+        messages = Message.objects.filter(conversation_id=entry.conversation_id, is_active=True)
+        from_others = messages.exclude(sender_id=entry.profile_id)
+        if from_others.filter(is_read=False).exists():
+            watermark = from_others.filter(is_read=True).order_by("-created_at").first()
+        else:
+            watermark = messages.order_by("-created_at").first()
+        if watermark is None:
+            continue
+        entry.last_read_message_id = watermark.id
+        entry.last_read_at = watermark.created_at
+        entries.append(entry)
+    InboxEntry.objects.bulk_update(entries, ["last_read_message", "last_read_at"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inboxentry',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inboxentry',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='apps.message'),
+        ),
+        migrations.RunPython(backfill_read_watermarks, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_conv_unread_idx',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
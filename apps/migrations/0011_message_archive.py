@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:35
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+def create_archive_table(apps, schema_editor):
+    """Creates MessageArchive as a range-partitioned table on PostgreSQL, a plain one elsewhere."""
+    MessageArchive = apps.get_model("apps", "MessageArchive")
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.create_model(MessageArchive)
+        return
+
+    schema_editor.execute("""
+        CREATE TABLE apps_messagearchive (
+            id uuid NOT NULL,
+            created_at timestamp with time zone NOT NULL,
+            updated_at timestamp with time zone NOT NULL,
+            is_active boolean NOT NULL,
+            conversation_id uuid NOT NULL,
+            sender_id uuid NOT NULL,
+            parent_id uuid NULL,
+            forwarded_from_id uuid NULL,
+            content text NULL,
+            is_forwarded boolean NOT NULL,
+            file_ids jsonb NOT NULL,
+            reaction_summary jsonb NOT NULL,
+            archived_at timestamp with time zone NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    # Safety net only: archive_messages creates the monthly partition before moving rows into it.
+    schema_editor.execute("CREATE TABLE apps_messagearchive_default PARTITION OF apps_messagearchive DEFAULT")
+    schema_editor.execute(
+        "CREATE INDEX archive_conv_created_idx ON apps_messagearchive (conversation_id, created_at DESC, id DESC)"
+    )
+    schema_editor.execute("CREATE INDEX archive_sender_idx ON apps_messagearchive (sender_id)")
+
+
+def drop_archive_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model("apps", "MessageArchive"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0010_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='MessageArchive',
+                    fields=[
+                        ('pk', models.CompositePrimaryKey('id', 'created_at', blank=True, editable=False, primary_key=True, serialize=False)),
+                        ('id', models.UUIDField(default=uuid.uuid4, editable=False)),
+                        ('created_at', models.DateTimeField()),
+                        ('updated_at', models.DateTimeField()),
+                        ('is_active', models.BooleanField(default=True)),
+                        ('parent_id', models.UUIDField(blank=True, null=True)),
+                        ('forwarded_from_id', models.UUIDField(blank=True, null=True)),
+                        ('content', models.TextField(blank=True, null=True)),
+                        ('is_forwarded', models.BooleanField(default=False)),
+                        ('file_ids', models.JSONField(default=list)),
+                        ('reaction_summary', models.JSONField(default=list)),
+                        ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('conversation', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='apps.conversation')),
+                        ('sender', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='apps.profile')),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['conversation', '-created_at', '-id'], name='archive_conv_created_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_archive_table, drop_archive_table),
+    ]
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def add_search_vector(apps, schema_editor):
+    """Stored tsvector of Message.content with a GIN index, PostgreSQL only."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    config = schema_editor.quote_value(settings.MESSAGE_SEARCH_CONFIG)
+    schema_editor.execute(
+        "ALTER TABLE apps_message ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector({config}::regconfig, coalesce(content, ''))) STORED"
+    )
+    schema_editor.execute("CREATE INDEX message_search_idx ON apps_message USING GIN (search_vector)")
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS message_search_idx")
+    schema_editor.execute("ALTER TABLE apps_message DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0011_message_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:39
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_reaction_summaries(apps, schema_editor):
+    """Aggregates the active reactions of every reacted message once."""
+    Message = apps.get_model("apps", "Message")
+    MessageReact = apps.get_model("apps", "MessageReact")
+
+    summaries = {}
+    rows = MessageReact.objects.filter(is_active=True).values(
+        "message_id", "reaction__reaction",
+    ).annotate(count=Count("id")).order_by("message_id", "-count", "reaction__reaction")
+    for row in rows.iterator(chunk_size=2000):
+        summaries.setdefault(row["message_id"], []).append(
+            {"reaction": row["reaction__reaction"], "count": row["count"]}
+        )
+    messages = [Message(id=message_id, reaction_summary=summary) for message_id, summary in summaries.items()]
+    Message.objects.bulk_update(messages, ["reaction_summary"], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0012_message_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='reaction_summary',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(backfill_reaction_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:42
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_reactions(apps, schema_editor):
+    """
+        Keeps one Reaction per text and one MessageReact per (message, profile, reaction).
+
+        Duplicate reactions are merged into the oldest row. Of duplicate
+        message reactions an active one is kept, the oldest first; the
+        summaries of the messages that lost rows are recomputed.
+    """
+    Reaction = apps.get_model("apps", "Reaction")
+    MessageReact = apps.get_model("apps", "MessageReact")
+    Message = apps.get_model("apps", "Message")
+
+    duplicated = Reaction.objects.values("reaction").annotate(n=Count("id")).filter(n__gt=1)
+    for row in duplicated:
+        ids = list(
+            Reaction.objects.filter(reaction=row["reaction"]).order_by("created_at", "id").values_list("id", flat=True)
+        )
+        MessageReact.objects.filter(reaction_id__in=ids[1:]).update(reaction_id=ids[0])
+        Reaction.objects.filter(id__in=ids[1:]).delete()
+
+    touched = set()
+    duplicated = MessageReact.objects.values("message_id", "reacted_by_id", "reaction_id").annotate(
+        n=Count("id"),
+    ).filter(n__gt=1)
+    for row in duplicated:
+        ids = list(
+            MessageReact.objects.filter(
+                message_id=row["message_id"],
+                reacted_by_id=row["reacted_by_id"],
+                reaction_id=row["reaction_id"],
+            ).order_by("-is_active", "created_at", "id").values_list("id", flat=True)
+        )
+        MessageReact.objects.filter(id__in=ids[1:]).delete()
+        touched.add(row["message_id"])
+
+    summaries = {message_id: [] for message_id in touched}
+    rows = MessageReact.objects.filter(message_id__in=touched, is_active=True).values(
+        "message_id", "reaction__reaction",
+    ).annotate(count=Count("id")).order_by("message_id", "-count", "reaction__reaction")
+    for row in rows:
+        summaries[row["message_id"]].append({"reaction": row["reaction__reaction"], "count": row["count"]})
+    messages = [Message(id=message_id, reaction_summary=summary) for message_id, summary in summaries.items()]
+    Message.objects.bulk_update(messages, ["reaction_summary"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0013_message_reaction_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_reactions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='reaction',
+            name='reaction',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='messagereact',
+            constraint=models.UniqueConstraint(fields=('message', 'reacted_by', 'reaction'), name='messagereact_unique_reaction'),
+        ),
+    ]
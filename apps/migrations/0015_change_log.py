@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0014_unique_reactions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('message', 'Message'), ('reaction', 'Reaction'), ('read', 'Read watermark'), ('settings', 'Settings'), ('request', 'Request')], max_length=16)),
+                ('object_id', models.UUIDField()),
+                ('conversation_id', models.UUIDField(blank=True, null=True)),
+                ('profile_id', models.UUIDField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['conversation_id', 'id'], name='changelog_conv_seq_idx'), models.Index(fields=['profile_id', 'id'], name='changelog_profile_seq_idx')],
+            },
+        ),
+    ]
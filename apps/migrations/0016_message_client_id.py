@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0015_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='client_message_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_message_id__isnull', False)), fields=('sender', 'client_message_id'), name='message_sender_client_id_uniq'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_reply_counts(apps, schema_editor):
+    """Counts the active direct replies of every message that has any, in one UPDATE."""
+    Message = apps.get_model("apps", "Message")
+    replies = Message.objects.filter(
+        parent_id=OuterRef("pk"), is_active=True,
+    ).order_by().values("parent_id").annotate(count=Count("id")).values("count")
+    parent_ids = Message.objects.filter(is_active=True, parent__isnull=False).values("parent_id")
+    Message.objects.filter(id__in=parent_ids).update(reply_count=Coalesce(Subquery(replies), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0016_message_client_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_reply_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0017_message_reply_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='message_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inboxentry',
+            name='unread_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
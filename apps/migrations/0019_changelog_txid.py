@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0018_unread_seq'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='changelog',
+            name='changelog_conv_seq_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='changelog',
+            name='changelog_profile_seq_idx',
+        ),
+        migrations.AddField(
+            model_name='changelog',
+            name='txid',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['conversation_id', 'txid', 'id'], name='changelog_conv_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['profile_id', 'txid', 'id'], name='changelog_profile_seq_idx'),
+        ),
+    ]
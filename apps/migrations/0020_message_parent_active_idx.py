@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0019_changelog_txid'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['parent', 'created_at', 'id'], name='message_parent_active_idx'),
+        ),
+    ]
@@ -8,5 +8,9 @@ from .chat import (
     Attachments,
     Request, 
     MessageReact,
-    Reaction
+    Reaction,
+    InboxEntry,
+    MessageArchive,
+    ChangeLog,
+    make_pair_key
 )
\ No newline at end of file
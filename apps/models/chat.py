@@ -1,12 +1,20 @@
 import os
+import json
 import uuid
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from typing import List, Dict, Any, Optional, DefaultDict, OrderedDict
 from . import BaseModel
 from apps.media_storage import MediaStorage
 
+
+def make_pair_key(profile_id, other_id) -> str:
+    """Order-independent key of two profiles, used for their Request and private Conversation."""
+    return ":".join(sorted([str(profile_id), str(other_id)]))
+
+
 class Profile(BaseModel):
     user_id = models.CharField(max_length=255)
     first_name = models.CharField(max_length=255, null=True, blank=True)
@@ -50,6 +58,10 @@ class Conversation(BaseModel):
     approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     message_limit = models.IntegerField(default=0)
+    pair_key = models.CharField(max_length=73, unique=True, null=True, blank=True, editable=False)
+    # Bumped by every send while it holds the row lock, so it numbers sends in
+    # commit order; see `InboxEntry.record_message` and `UnreadCounter`
+    message_seq = models.PositiveBigIntegerField(default=0, editable=False)
     def __str__(self):
         return self.name or f"Room {self.id}"
     
@@ -68,21 +80,83 @@ class Conversation(BaseModel):
         if self.room_type == 'private' and not self.pk and self.more_than():
             raise ValidationError("A private conversation cannot have more than two participants.")
 
+    @classmethod
+    def next_message_seq(cls, conversation_id) -> int:
+        """Allocates the next `message_seq`; the row stays locked until the transaction ends."""
+        cls.objects.filter(pk=conversation_id).update(message_seq=models.F("message_seq") + 1)
+        return cls.objects.filter(pk=conversation_id).values_list("message_seq", flat=True).get()
+
+    def assign_pair_key(self) -> bool:
+        """
+            Stores the pair key of a private conversation once it has its two members.
+
+            Returns:
+                bool: False when another conversation already is the DM of the pair.
+        """
+        if self.pair_key:
+            return True
+        member_ids = list(self.profiles.values_list("id", flat=True))
+        if self.room_type != Conversation.PRIVATE or len(member_ids) != 2:
+            return False
+        key = make_pair_key(*member_ids)
+        if Conversation.objects.filter(pair_key=key).exclude(pk=self.pk).exists():
+            return False
+        Conversation.objects.filter(pk=self.pk).update(pair_key=key)
+        self.pair_key = key
+        return True
+
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+        if self.room_type == Conversation.PRIVATE:
+            self.assign_pair_key()
         for profile in self.profiles.all():
             self.settings.get_or_create(profile=profile)
+        InboxEntry.ensure_entries(self)
 
 class Message(BaseModel):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
     parent = models.ForeignKey("self", on_delete=models.SET_NULL, related_name="replies", null=True, blank=True)
     sender = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="messages")
     content = models.TextField(blank=True, null=True)
-    is_read = models.BooleanField(default=False)
     forwarded_from = models.ForeignKey("self", on_delete=models.SET_NULL, related_name="forwards", null=True, blank=True)
     is_forwarded = models.BooleanField(default=False)
     file = models.ManyToManyField("apps.Attachments", related_name="messages", null=True, blank=True)
+    # [{"reaction": ..., "count": ...}] most used first, kept up to date by MessageReact
+    reaction_summary = models.JSONField(default=list, blank=True, editable=False)
+    # Active direct replies, for thread badges; kept up to date by save()/delete()
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    # Optional dedupe key picked by the client, so retried sends store one message
+    client_message_id = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sender", "client_message_id"],
+                condition=models.Q(client_message_id__isnull=False),
+                name="message_sender_client_id_uniq",
+            ),
+        ]
+        indexes = [
+            # Message pages, last-message lookups and unread ranges of a conversation
+            models.Index(
+                fields=["conversation", "-created_at", "-id"],
+                condition=models.Q(is_active=True),
+                name="message_conv_active_idx",
+            ),
+            # "Has the sender already written here" check of the send policy
+            models.Index(fields=["sender", "conversation"], name="message_sender_conv_idx"),
+            # One level of a reply thread, oldest first, see `thread`
+            models.Index(
+                fields=["parent", "created_at", "id"],
+                condition=models.Q(is_active=True),
+                name="message_parent_active_idx",
+            ),
+        ]
+
+    # Denormalized counters updated in SQL, never written back from an instance
+    COUNTER_FIELDS = ("reaction_summary", "reply_count")
+
     def __str__(self):
         return f"Message from {self.sender} in Room {self.conversation.id}"
 
@@ -138,31 +212,236 @@ class Message(BaseModel):
             raise ValidationError("Receiver not found.")
 
         existing_request = Request.objects.filter(
-            models.Q(sender=self.sender, receiver=receiver) |
-            models.Q(sender=receiver, receiver=self.sender)
+            pair_key=make_pair_key(self.sender_id, receiver.id)
         ).first()
         if existing_request and existing_request.status == 'blocked':
             raise ValidationError("You cannot send a message due to a blocked request.")
 
 
-    def save(self, *args, **kwargs):
-        self.clean()
-        self.is_conversation_blocked()
-        super().save(*args, **kwargs)
+    def save(self, *args, validate=True, **kwargs):
+        """
+            Args:
+                validate (bool): Run the send checks; pass False when they already
+                    ran against a snapshot (see `message_service.send_message`).
+        """
+        if validate:
+            self.clean()
+            self.is_conversation_blocked()
+        adding = self._state.adding
+        previous_parent_id = None
+        if not adding:
+            previous_parent_id = Message.objects.filter(pk=self.pk).values_list("parent_id", flat=True).first()
+        if not adding and kwargs.get("update_fields") is None:
+            # Never write back counters loaded before a concurrent reaction or reply.
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                self.unread_seq = InboxEntry.record_message(self)
+            elif not self.is_active:
+                InboxEntry.refresh_last_message(self.conversation)
+            if self.parent_id and adding and self.is_active:
+                Message.objects.filter(pk=self.parent_id).update(reply_count=models.F("reply_count") + 1)
+            elif not adding:
+                for parent_id in {self.parent_id, previous_parent_id} - {None}:
+                    Message.recount_replies(parent_id)
+            ChangeLog.record(ChangeLog.MESSAGE, self.id, conversation_id=self.conversation_id)
+
+            if self.conversation.message_limit == 0:
+                Conversation.objects.filter(pk=self.conversation_id, message_limit=0).update(
+                    message_limit=models.F("message_limit") + 1,
+                )
+                self.conversation.message_limit += 1
+
+    def delete(self, *args, **kwargs):
+        message_id = self.id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if self.parent_id:
+                Message.recount_replies(self.parent_id)
+            ChangeLog.record(ChangeLog.MESSAGE, message_id, conversation_id=self.conversation_id)
+        return result
+
+    @staticmethod
+    def recount_replies(message_id: Any) -> None:
+        """Recounts the active replies of one message in a single UPDATE."""
+        replies = Message.objects.filter(
+            parent_id=models.OuterRef("pk"), is_active=True,
+        ).order_by().values("parent_id").annotate(count=models.Count("id")).values("count")
+        Message.objects.filter(pk=message_id).update(
+            reply_count=Coalesce(models.Subquery(replies), 0),
+        )
+
+    def thread(self, max_depth: int, max_size: int) -> List["Message"]:
+        """
+            The active reply subtree under this message, read one level at a time.
+
+            Messages come breadth first (root at depth 0, then by depth and
+            creation time), each with a `depth` attribute. Replies deeper than
+            `max_depth` aren't followed. Each level only reads the rows still
+            allowed, so at most `max_size` messages are read however large the
+            thread is; a truncated thread loses its deepest replies first.
+            Inactive replies are skipped along with their subtrees.
+        """
+        self.depth = 0
+        thread = [self]
+        level = [self.pk]
+        depth = 0
+        while level and depth < max_depth and len(thread) < max_size:
+            depth += 1
+            replies = list(
+                Message.objects.filter(parent_id__in=level, is_active=True)
+                .order_by("created_at", "id")[:max_size - len(thread)]
+            )
+            for reply in replies:
+                reply.depth = depth
+            thread.extend(replies)
+            level = [reply.pk for reply in replies]
+        return thread
 
-        if self.conversation.message_limit == 0:
-            self.conversation.message_limit += 1
-            self.conversation.save()
 class Reaction(BaseModel):
-    reaction = models.CharField(max_length=255)
+    reaction = models.CharField(max_length=255, unique=True)
+
+# Applies one reaction's count change to the stored summary in a single
+# statement, so concurrent reactions only queue on the row for the UPDATE
+# itself. Zero counts are dropped and the list stays most used first.
+SUMMARY_DELTA_SQL = """
+UPDATE apps_message SET reaction_summary = (
+    SELECT COALESCE(
+        jsonb_agg(jsonb_build_object('reaction', reaction, 'count', count) ORDER BY count DESC, reaction),
+        '[]'::jsonb
+    )
+    FROM (
+        SELECT reaction, SUM(count)::int AS count FROM (
+            SELECT item->>'reaction' AS reaction, (item->>'count')::int AS count
+            FROM jsonb_array_elements(apps_message.reaction_summary) AS item
+            UNION ALL
+            SELECT %s::text, %s::int
+        ) AS changes
+        GROUP BY reaction
+        HAVING SUM(count) > 0
+    ) AS summary
+)
+WHERE id = %s
+RETURNING reaction_summary
+"""
 
 class MessageReact(BaseModel):
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name="message_reaction")
     reacted_by = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="profile_reactions")
     reaction = models.ForeignKey(Reaction, on_delete=models.CASCADE, related_name="reactions")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["message", "reacted_by", "reaction"],
+                name="messagereact_unique_reaction",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.reacted_by} - {self.reaction.reaction} on Message {self.message.id}"
 
+    def save(self, *args, **kwargs):
+        previous = None
+        if not self._state.adding:
+            previous = MessageReact.objects.filter(pk=self.pk).values(
+                "message_id", "reaction__reaction", "is_active",
+            ).first()
+        current = {"message_id": self.message_id, "reaction__reaction": self.reaction.reaction, "is_active": self.is_active}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous == current:
+                return
+            if previous and previous["is_active"]:
+                self.summary = MessageReact.apply_delta(previous["message_id"], previous["reaction__reaction"], -1)
+            if self.is_active:
+                self.summary = MessageReact.apply_delta(self.message_id, self.reaction.reaction, 1)
+            ChangeLog.record(ChangeLog.REACTION, self.message_id, conversation_id=self.message.conversation_id)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if self.is_active:
+                self.summary = MessageReact.apply_delta(self.message_id, self.reaction.reaction, -1)
+                ChangeLog.record(ChangeLog.REACTION, self.message_id, conversation_id=self.message.conversation_id)
+        return result
+
+    @staticmethod
+    def apply_delta(message_id: Any, reaction: str, delta: int) -> List[Dict[str, Any]]:
+        """
+            Adds `delta` to the count of `reaction` in `Message.reaction_summary`.
+
+            On PostgreSQL this is one UPDATE over the stored jsonb; elsewhere the
+            summary is recomputed with `refresh_summaries`.
+
+            Returns:
+                List[Dict[str, Any]]: The message's summary after the change.
+        """
+        if connection.vendor != "postgresql":
+            return MessageReact.refresh_summaries([message_id]).get(message_id, [])
+        with connection.cursor() as cursor:
+            cursor.execute(SUMMARY_DELTA_SQL, [reaction, delta, message_id])
+            row = cursor.fetchone()
+        if row is None:
+            return []
+        return json.loads(row[0]) if isinstance(row[0], str) else row[0]
+
+    @staticmethod
+    def summary_rows(message_ids) -> models.QuerySet:
+        """Active reaction counts per (message, reaction), one GROUP BY for all of `message_ids`."""
+        return MessageReact.objects.filter(
+            message_id__in=message_ids,
+            is_active=True,
+        ).values("message_id", "reaction__reaction").annotate(
+            count=models.Count("id"),
+        ).order_by("message_id", "-count", "reaction__reaction")
+
+    @staticmethod
+    def summaries(message_ids) -> Dict[Any, List[Dict[str, Any]]]:
+        """
+            Batch loader for live reaction summaries.
+
+            Args:
+                message_ids: Messages to summarize.
+            Returns:
+                Dict[Any, List[Dict[str, Any]]]: `Message.reaction_summary` values
+                keyed by message id; messages without reactions are left out.
+        """
+        result: Dict[Any, List[Dict[str, Any]]] = {}
+        for row in MessageReact.summary_rows(message_ids):
+            result.setdefault(row["message_id"], []).append(
+                {"reaction": row["reaction__reaction"], "count": row["count"]}
+            )
+        return result
+
+    @staticmethod
+    def refresh_summaries(message_ids) -> Dict[Any, List[Dict[str, Any]]]:
+        """
+            Recomputes `Message.reaction_summary` of `message_ids` from the reactions.
+
+            The message rows are locked first, so concurrent refreshes of the
+            same message are applied one after the other and the last writer
+            always counts every committed reaction. The lock is FOR NO KEY
+            UPDATE so it doesn't wait on the key-share lock a reaction insert
+            already holds on its message.
+
+            Returns:
+                Dict[Any, List[Dict[str, Any]]]: The new summaries keyed by message id.
+        """
+        with transaction.atomic():
+            ids = list(
+                Message.objects.select_for_update(no_key=True).filter(id__in=message_ids)
+                .order_by("id").values_list("id", flat=True)
+            )
+            summaries = MessageReact.summaries(ids)
+            for message_id in ids:
+                Message.objects.filter(id=message_id).update(reaction_summary=summaries.get(message_id, []))
+        return summaries
+
     
 class ConversationSettings(BaseModel):
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="conversation_settings")
@@ -176,6 +455,13 @@ class ConversationSettings(BaseModel):
 
     class Meta:
         unique_together = ('profile', 'conversation')
+        indexes = [
+            models.Index(
+                fields=["profile", "-created_at"],
+                condition=models.Q(is_active=True),
+                name="settings_profile_active_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.profile.first_name} - {self.conversation}"
@@ -198,7 +484,11 @@ class ConversationSettings(BaseModel):
         elif not self.is_trashed:
             self.last_trashed_at = None
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            InboxEntry.sync_settings(self)
+            # Settings are private to their profile, never logged for the whole conversation.
+            ChangeLog.record(ChangeLog.SETTINGS, self.id, profile_ids=[self.profile_id])
 
 class Request(BaseModel):
     sender = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="sent_requests")
@@ -214,8 +504,30 @@ class Request(BaseModel):
         ],
         default='pending'
     )
+    pair_key = models.CharField(max_length=73, unique=True, null=True, blank=True, editable=False)
     class Meta:
         unique_together = ('sender', 'receiver')
+        indexes = [
+            # Friend adjacency lists, see apps.utils.utils.friend_ids
+            models.Index(fields=["sender", "status"], name="request_sender_status_idx"),
+            models.Index(fields=["receiver", "status"], name="request_receiver_status_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.pair_key:
+            self.pair_key = make_pair_key(self.sender_id, self.receiver_id)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            InboxEntry.sync_request(self.sender_id, self.receiver_id)
+            ChangeLog.record(ChangeLog.REQUEST, self.id, profile_ids=[self.sender_id, self.receiver_id])
+
+    def delete(self, *args, **kwargs):
+        request_id = self.id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            InboxEntry.sync_request(self.sender_id, self.receiver_id)
+            ChangeLog.record(ChangeLog.REQUEST, request_id, profile_ids=[self.sender_id, self.receiver_id])
+        return result
     
     def can_send_message(self):
         if self.status == 'pending':
@@ -242,3 +554,266 @@ class Attachments(BaseModel):
             self.file_type = os.path.splitext(self.file.name)[1]  # Extract file extension
             self.file_size = self.file.size
         super().save(*args, **kwargs)
+
+
+class InboxEntry(BaseModel):
+    """
+        Denormalized inbox row, one per (profile, conversation).
+
+        Kept up to date by Message, ConversationSettings and Request saves so
+        the conversation list can be read with a single indexed scan.
+    """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="inbox_entries")
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="inbox_entries")
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, related_name="+", null=True, blank=True)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    unread_count = models.PositiveIntegerField(default=0)
+    is_muted = models.BooleanField(default=False)
+    is_blocked = models.BooleanField(default=False)
+    is_trashed = models.BooleanField(default=False)
+    request_status = models.CharField(max_length=10, null=True, blank=True)
+    last_read_message = models.ForeignKey(Message, on_delete=models.SET_NULL, related_name="+", null=True, blank=True)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    # Conversation.message_seq of the last send counted in unread_count
+    unread_seq = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('profile', 'conversation')
+        indexes = [
+            models.Index(fields=["profile", "-last_activity_at"], name="inbox_profile_activity_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.profile} - {self.conversation}"
+
+    @staticmethod
+    def latest_request_status(profile_id, other_id) -> Optional[str]:
+        return Request.objects.filter(
+            pair_key=make_pair_key(profile_id, other_id)
+        ).values_list("status", flat=True).first()
+
+    @classmethod
+    def ensure_entries(cls, conversation: Conversation) -> None:
+        """Creates the missing entries for the current members of `conversation`."""
+        member_ids = list(conversation.profiles.values_list("id", flat=True))
+        existing = set(
+            cls.objects.filter(conversation=conversation).values_list("profile_id", flat=True)
+        )
+        missing = [profile_id for profile_id in member_ids if profile_id not in existing]
+        if not missing:
+            return
+
+        settings = {
+            item.profile_id: item
+            for item in conversation.settings.filter(profile_id__in=missing)
+        }
+        last_message = conversation.messages.filter(is_active=True).order_by("-created_at").first()
+        entries = []
+        for profile_id in missing:
+            others = [other_id for other_id in member_ids if other_id != profile_id]
+            item = settings.get(profile_id)
+            entries.append(cls(
+                profile_id=profile_id,
+                conversation=conversation,
+                last_message=last_message,
+                last_activity_at=last_message.created_at if last_message else conversation.created_at,
+                is_muted=bool(item and item.is_muted),
+                is_blocked=bool(item and item.is_blocked),
+                is_trashed=bool(item and item.is_trashed),
+                request_status=(
+                    cls.latest_request_status(profile_id, others[0])
+                    if conversation.room_type == Conversation.PRIVATE and len(others) == 1 else None
+                ),
+            ))
+        cls.objects.bulk_create(entries, ignore_conflicts=True)
+
+    @classmethod
+    def record_message(cls, message: Message, count: int = 1) -> int:
+        """
+            Moves the conversation to the top of every member's inbox and bumps their unread count.
+
+            Args:
+                message (Message): The newest message of the conversation.
+                count (int): How many messages were added, when recording a batch.
+            Returns:
+                int: The send's `Conversation.message_seq`, passed on to `UnreadCounter.increment`.
+        """
+        seq = Conversation.next_message_seq(message.conversation_id)
+        cls.objects.filter(conversation_id=message.conversation_id).update(
+            last_message=message,
+            last_activity_at=message.created_at,
+            unread_count=models.Case(
+                models.When(profile_id=message.sender_id, then=models.F("unread_count")),
+                default=models.F("unread_count") + count,
+            ),
+            unread_seq=seq,
+            updated_at=timezone.now(),
+        )
+        return seq
+
+    @classmethod
+    def refresh_last_message(cls, conversation: Conversation) -> None:
+        last_message = conversation.messages.filter(is_active=True).order_by("-created_at").first()
+        cls.objects.filter(conversation=conversation).update(
+            last_message=last_message,
+            updated_at=timezone.now(),
+        )
+
+    def unread_messages(self) -> models.QuerySet:
+        """Messages of the other members past the read watermark, a range scan of the conversation index."""
+        messages = Message.objects.filter(
+            conversation_id=self.conversation_id,
+            is_active=True,
+        ).exclude(sender_id=self.profile_id)
+        if self.last_read_at:
+            messages = messages.filter(created_at__gt=self.last_read_at)
+        return messages
+
+    @classmethod
+    def mark_read(cls, conversation_id, profile_id) -> None:
+        """Moves the profile's read watermark to the newest message of the conversation."""
+        latest = Message.objects.filter(
+            conversation_id=conversation_id,
+            is_active=True,
+        ).order_by("-created_at", "-id")
+        with transaction.atomic():
+            cls.objects.filter(conversation_id=conversation_id, profile_id=profile_id).update(
+                last_read_message=models.Subquery(latest.values("id")[:1]),
+                last_read_at=Coalesce(models.Subquery(latest.values("created_at")[:1]), models.F("last_read_at")),
+                unread_count=0,
+                updated_at=timezone.now(),
+            )
+            ChangeLog.record(ChangeLog.READ, profile_id, conversation_id=conversation_id)
+
+    @classmethod
+    def sync_settings(cls, settings: "ConversationSettings") -> None:
+        cls.objects.filter(conversation_id=settings.conversation_id, profile_id=settings.profile_id).update(
+            is_muted=settings.is_muted,
+            is_blocked=settings.is_blocked,
+            is_trashed=settings.is_trashed,
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def sync_request(cls, sender_id, receiver_id) -> None:
+        """Stores the request status on the private conversation between the two profiles."""
+        cls.objects.filter(
+            profile_id__in=[sender_id, receiver_id],
+            conversation__pair_key=make_pair_key(sender_id, receiver_id),
+        ).update(
+            request_status=cls.latest_request_status(sender_id, receiver_id),
+            updated_at=timezone.now(),
+        )
+
+
+class MessageArchive(models.Model):
+    """
+        Cold copy of messages older than MESSAGE_ARCHIVE_AFTER_DAYS.
+
+        On PostgreSQL the table is range-partitioned by month on `created_at`
+        (see the `archive_messages` command), so the key includes it. Rows are
+        write-once: attachments and reactions are frozen into `file_ids` and
+        `reaction_summary` when the message is moved, and reply/forward links
+        are kept as plain ids.
+    """
+    pk = models.CompositePrimaryKey("id", "created_at")
+    id = models.UUIDField(default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="archived_messages", db_constraint=False, db_index=False)
+    sender = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="archived_messages", db_constraint=False)
+    parent_id = models.UUIDField(null=True, blank=True)
+    forwarded_from_id = models.UUIDField(null=True, blank=True)
+    content = models.TextField(blank=True, null=True)
+    is_forwarded = models.BooleanField(default=False)
+    file_ids = models.JSONField(default=list)
+    reaction_summary = models.JSONField(default=list)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["conversation", "-created_at", "-id"], name="archive_conv_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived message from {self.sender_id} in Room {self.conversation_id}"
+
+
+class TransactionId(models.Func):
+    """The writing transaction's id, `pg_current_xact_id()`; NULL on other backends."""
+    template = "NULL"
+    output_field = models.BigIntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return "pg_current_xact_id()::text::bigint", []
+
+
+class ChangeLog(models.Model):
+    """
+        Append-only change sequence read by the sync endpoint.
+
+        Every change a client caches (messages, reactions, read watermarks,
+        settings, requests) appends a row. Rows only say *what* changed, the
+        sync endpoint loads the current state. Changes in a conversation are
+        visible to its members, requests and settings to `profile_id`.
+
+        Clients resume from `position_field()`. Ids are handed out at insert,
+        not at commit, so on Postgres rows are ordered by the id of their
+        writing transaction instead and only served once every older
+        transaction has ended (see `ChangeFeed`). Other backends run one
+        writer at a time, there the id already is in commit order.
+    """
+    MESSAGE = "message"
+    REACTION = "reaction"
+    READ = "read"
+    SETTINGS = "settings"
+    REQUEST = "request"
+    KINDS = [
+        (MESSAGE, "Message"),
+        (REACTION, "Reaction"),
+        (READ, "Read watermark"),
+        (SETTINGS, "Settings"),
+        (REQUEST, "Request"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=16, choices=KINDS)
+    # Message id for messages/reactions, profile id for read watermarks
+    object_id = models.UUIDField()
+    conversation_id = models.UUIDField(null=True, blank=True)
+    profile_id = models.UUIDField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Writing transaction on Postgres, NULL elsewhere
+    txid = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["conversation_id", "txid", "id"], name="changelog_conv_seq_idx"),
+            models.Index(fields=["profile_id", "txid", "id"], name="changelog_profile_seq_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} {self.object_id}"
+
+    @staticmethod
+    def position_field() -> str:
+        return "txid" if connection.vendor == "postgresql" else "id"
+
+    @classmethod
+    def record(cls, kind: str, object_id: Any, conversation_id: Any = None, profile_ids: Optional[List[Any]] = None) -> None:
+        """Appends one row, or one per profile when the change belongs to profiles instead of a conversation."""
+        if profile_ids:
+            cls.objects.bulk_create([
+                cls(kind=kind, object_id=object_id, profile_id=profile_id, txid=TransactionId())
+                for profile_id in profile_ids
+            ])
+        else:
+            cls.objects.create(kind=kind, object_id=object_id, conversation_id=conversation_id, txid=TransactionId())
+
+    @classmethod
+    def record_many(cls, kind: str, object_ids: List[Any], conversation_id: Any) -> None:
+        cls.objects.bulk_create([
+            cls(kind=kind, object_id=object_id, conversation_id=conversation_id, txid=TransactionId())
+            for object_id in object_ids
+        ])
@@ -1,4 +1,8 @@
 from .conversation import ConversationRepo
 from .profile import ProfileRepo
 from .interactions import InteractionService
+from .unread import UnreadCounter
+from .search import MessageSearch
+from .reaction import ReactionCatalog, ReactionRepo
+from .sync import ChangeFeed, SyncExpired
 # from .message import M
\ No newline at end of file
@@ -2,6 +2,7 @@ import uuid
 import logging
 import datetime
 from typing import Dict, List, Optional, Any, Set
+from django.db.models import Exists, F, OuterRef, QuerySet
 from apps.models import Conversation, Profile
 
 log = logging.getLogger(__name__)
@@ -11,4 +12,36 @@ class ConversationRepo():
         pass
 
     def get(self, id):
-        return Conversation.objects.get(id=id)
\ No newline at end of file
+        return Conversation.objects.get(id=id)
+
+    def for_profile(self, profile: Profile, statuses: Optional[List[str]] = None) -> QuerySet:
+        """
+            Conversations of `profile` that have another participant, read from its inbox.
+
+            Rows are joined to the profile's InboxEntry and annotated with its
+            `request_status`, `unread_count` and `last_activity_at`, so the list
+            is a single range scan of the (profile, last_activity_at) index.
+
+            Args:
+                profile (Profile): The member whose conversations are listed.
+                statuses (List[str]): When given, only conversations whose latest
+                    request status is one of these are returned.
+            Returns:
+                QuerySet: Active conversations, most recent activity first.
+        """
+        other_members = Conversation.profiles.through.objects.filter(
+            conversation_id=OuterRef("pk"),
+        ).exclude(profile_id=profile.id)
+
+        conversations = Conversation.objects.filter(
+            Exists(other_members),
+            is_active=True,
+            inbox_entries__profile=profile,
+        ).annotate(
+            request_status=F("inbox_entries__request_status"),
+            unread_count=F("inbox_entries__unread_count"),
+            last_activity_at=F("inbox_entries__last_activity_at"),
+        ).order_by("-last_activity_at")
+        if statuses:
+            conversations = conversations.filter(request_status__in=statuses)
+        return conversations
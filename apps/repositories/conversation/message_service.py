@@ -1,41 +1,329 @@
-from django.db.models import Q
-from rest_framework.exceptions import PermissionDenied, ValidationError
+import datetime
+import logging
+from typing import Any, Dict, List, Optional
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
 from django.shortcuts import get_object_or_404
-from apps.models.chat import Message, Conversation, Request
+from apps.models.chat import (ChangeLog, Message, Conversation, ConversationSettings, InboxEntry,
+                              Profile, Request, make_pair_key)
+from apps.utils.utils import have_mutual_friend
 
+log = logging.getLogger(__name__)
 
-def validate_and_create_message(data, user):
-    conversation_id = data.get("conversation")
-    if not conversation_id:
-        raise ValidationError("Conversation ID is required.")
 
-    conversation = get_object_or_404(Conversation, id=conversation_id)
+class SendSnapshot:
+    """
+        State of a conversation as seen by one send, loaded once.
 
-    # Determine receiver from conversation
-    receiver = next((profile for profile in conversation.profiles.all() if profile != user), None)
-    if not receiver:
+        Args:
+            conversation (Conversation): The conversation, locked for the send.
+            sender (Profile): The sending profile.
+            members (List[Profile]): Current members of the conversation.
+            settings (Dict[Any, ConversationSettings]): Settings keyed by profile id.
+            relationship (Request): The pair's request, private conversations only.
+    """
+    # Set when the send was a retry answered with the already stored message
+    replayed = False
+
+    def __init__(self,
+                 conversation: Conversation,
+                 sender: Profile,
+                 members: List[Profile],
+                 settings: Dict[Any, ConversationSettings],
+                 relationship: Optional[Request]):
+        self.conversation = conversation
+        self.sender = sender
+        self.members = members
+        self.settings = settings
+        self.relationship = relationship
+
+    @property
+    def is_private(self) -> bool:
+        return self.conversation.room_type == Conversation.PRIVATE
+
+    @property
+    def is_member(self) -> bool:
+        return any(member.id == self.sender.id for member in self.members)
+
+    @property
+    def recipients(self) -> List[Profile]:
+        return [member for member in self.members if member.id != self.sender.id]
+
+    @property
+    def listeners(self) -> List[Profile]:
+        """Recipients the message is pushed to: members who muted or blocked the conversation aren't."""
+        return [member for member in self.recipients if not self.is_silenced(member.id)]
+
+    def is_silenced(self, profile_id: Any) -> bool:
+        settings = self.settings.get(profile_id)
+        return bool(settings and (settings.is_muted or settings.is_blocked))
+
+    @property
+    def receiver(self) -> Optional[Profile]:
+        recipients = self.recipients
+        if self.is_private and len(recipients) == 1:
+            return recipients[0]
+        return None
+
+    def already_sent(self) -> bool:
+        return Message.objects.filter(sender=self.sender, conversation=self.conversation).exists()
+
+
+def load_snapshot(conversation_id: Any, sender: Profile) -> SendSnapshot:
+    """Loads the conversation (row-locked inside a transaction), its members, settings and relationship."""
+    conversation = get_object_or_404(Conversation.objects.select_for_update(), id=conversation_id)
+    members = list(conversation.profiles.all())
+    settings = {item.profile_id: item for item in conversation.settings.all()}
+
+    relationship = None
+    if conversation.room_type == Conversation.PRIVATE and len(members) == 2:
+        other = next((member for member in members if member.id != sender.id), None)
+        if other:
+            relationship = Request.objects.filter(pair_key=make_pair_key(sender.id, other.id)).first()
+    return SendSnapshot(conversation, sender, members, settings, relationship)
+
+
+def ensure_relationship(snapshot: SendSnapshot) -> None:
+    """Opens a hidden request between strangers of a private conversation who share a friend."""
+    receiver = snapshot.receiver
+    if snapshot.relationship or not receiver or not snapshot.is_member:
+        return
+    if not have_mutual_friend(snapshot.sender.id, receiver.id):
+        return
+    relationship, created = Request.objects.get_or_create(
+        pair_key=make_pair_key(snapshot.sender.id, receiver.id),
+        defaults={"sender": snapshot.sender, "receiver": receiver, "status": "hidden"},
+    )
+    if not created and relationship.status != "hidden":
+        relationship.status = "hidden"
+        relationship.save()
+    snapshot.relationship = relationship
+
+
+def check_send_policy(snapshot: SendSnapshot) -> None:
+    """
+        Runs every send rule against the snapshot.
+
+        Raises:
+            PermissionDenied: The sender may not post in this conversation now.
+            ValidationError: The conversation can't take a message.
+    """
+    conversation = snapshot.conversation
+    if not snapshot.is_member:
+        raise PermissionDenied("You are not a member of this conversation.")
+    if not snapshot.recipients:
         raise ValidationError("Receiver not found in this conversation.")
+    if snapshot.is_private and not snapshot.receiver:
+        raise ValidationError("This message can only be sent in a conversation with two participants.")
+
+    if not (conversation.approved or conversation.message_limit == 0):
+        raise ValidationError("You can't send a message to this user yet.")
+
+    own_settings = snapshot.settings.get(snapshot.sender.id)
+    if own_settings and own_settings.is_blocked:
+        raise PermissionDenied("You can't send a message to this user, you blocked this conversation.")
+    if snapshot.is_private:
+        other_settings = snapshot.settings.get(snapshot.receiver.id)
+        if other_settings and other_settings.is_blocked:
+            raise PermissionDenied("You can't send a message to this user, you are blocked")
+
+    relationship = snapshot.relationship
+    if not relationship:
+        return
+    if relationship.status == "blocked":
+        raise PermissionDenied("You are blocked from sending messages to this user.")
+    elif relationship.status == "pending" and snapshot.already_sent():
+        raise PermissionDenied("You can only send one message while the request is pending.")
+    elif relationship.status == "hidden" and snapshot.already_sent():
+        raise PermissionDenied("Message request is already sent!")
+
+
+def send_message(validated_data: Dict[str, Any], user: Profile) -> SendSnapshot:
+    """
+        Validates and stores a message in one transaction.
+
+        A send carrying a `client_message_id` the sender already used is a
+        retry: nothing is stored or checked again and the stored message is
+        returned with `snapshot.replayed` set.
+
+        Args:
+            validated_data (Dict[str, Any]): `MessageSerializer` validated data.
+            user (Profile): The sender.
+        Returns:
+            SendSnapshot: The snapshot the message was checked against, with the
+            new message as `snapshot.message`.
+    """
+    data = dict(validated_data)
+    files = data.pop("file", None)
+    data["sender"] = user
+    data["client_message_id"] = data.get("client_message_id") or None
+    client_message_id = data["client_message_id"]
+    if client_message_id:
+        existing = find_sent(user, client_message_id)
+        if existing:
+            return replay(existing, user)
+
+    try:
+        with transaction.atomic():
+            snapshot = load_snapshot(data.pop("conversation").id, user)
+            ensure_relationship(snapshot)
+            check_send_policy(snapshot)
+
+            message = Message(conversation=snapshot.conversation, **data)
+            message.save(validate=False)
+            if files:
+                message.file.set(files)
+    except IntegrityError:
+        # A concurrent retry with the same key committed first.
+        existing = find_sent(user, client_message_id) if client_message_id else None
+        if existing is None:
+            raise
+        return replay(existing, user)
+    snapshot.message = message
+    return snapshot
+
+
+def find_sent(user: Profile, client_message_id: str) -> Optional[Message]:
+    return Message.objects.filter(sender=user, client_message_id=client_message_id).first()
+
+
+def replay(message: Message, user: Profile) -> SendSnapshot:
+    snapshot = SendSnapshot(message.conversation, user, [], {}, None)
+    snapshot.message = message
+    snapshot.replayed = True
+    return snapshot
+
+
+def dedupe_key(sender_id: Any, client_message_id: str) -> str:
+    return f"message:sent:{sender_id}:{client_message_id}"
+
+
+def cached_send(sender_id: Any, client_message_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The response of an earlier send with this key, if it's still in Redis."""
+    if not client_message_id:
+        return None
+    try:
+        return cache.get(dedupe_key(sender_id, client_message_id))
+    except Exception as e:
+        log.warning(f"Send dedupe cache unavailable: {e}")
+        return None
+
+
+def remember_send(sender_id: Any, client_message_id: Optional[str], data: Dict[str, Any]) -> None:
+    """Keeps the response for MESSAGE_DEDUPE_TTL so hot retries are answered from Redis."""
+    if not client_message_id:
+        return
+    try:
+        cache.set(dedupe_key(sender_id, client_message_id), data, timeout=django_settings.MESSAGE_DEDUPE_TTL)
+    except Exception as e:
+        log.warning(f"Send dedupe cache unavailable: {e}")
+
+
+
+class ForwardResult:
+    """
+        Outcome of `forward_messages`.
+
+        Args:
+            messages (Dict[Any, List[Message]]): Created messages per target conversation id.
+            snapshots (Dict[Any, SendSnapshot]): The snapshot each target was checked against,
+                whose recipients and listeners the copies are delivered to.
+            errors (List[Dict[str, Any]]): One entry per rejected target or message.
+    """
+
+    def __init__(self):
+        self.messages: Dict[Any, List[Message]] = {}
+        self.snapshots: Dict[Any, SendSnapshot] = {}
+        self.errors: List[Dict[str, Any]] = []
+
+    def error(self, conversation_id: Any, detail: Any) -> None:
+        self.errors.append({"conversation": str(conversation_id), "error": str(detail)})
+
+
+def forward_messages(message_ids: List[Any], conversation_ids: List[Any], user: Profile) -> ForwardResult:
+    """
+        Forwards messages to several conversations with one policy check and one insert per target.
+
+        Each target is handled in its own transaction so a rejected target
+        doesn't undo the others. The copies keep the order of the originals;
+        a conversation that isn't approved yet only takes the first one.
+
+        Args:
+            message_ids (List[Any]): Messages to forward, from conversations `user` is in.
+            conversation_ids (List[Any]): Target conversations.
+            user (Profile): The forwarding profile.
+        Returns:
+            ForwardResult: Created messages, the snapshots to deliver them with and per-target errors.
+    """
+    result = ForwardResult()
+    sources = list(
+        Message.objects.filter(
+            id__in=message_ids,
+            is_active=True,
+            conversation__profiles=user,
+        ).order_by("created_at", "id")
+    )
+    if not sources:
+        return result
+
+    found = set()
+    for conversation in Conversation.objects.filter(id__in=conversation_ids).only("id"):
+        found.add(str(conversation.id))
+        try:
+            with transaction.atomic():
+                snapshot = load_snapshot(conversation.id, user)
+                check_send_policy(snapshot)
+                batch = sources
+                if not snapshot.conversation.approved:
+                    batch = sources[:1]
+                    for source in sources[1:]:
+                        result.error(conversation.id, f"Message {source.id} not sent, the conversation isn't approved yet.")
+                result.messages[conversation.id] = bulk_forward(snapshot, batch)
+        except APIException as e:
+            result.error(conversation.id, e.detail if isinstance(e.detail, str) else e.detail[0])
+            continue
+        except Exception as e:
+            result.error(conversation.id, e)
+            continue
+        result.snapshots[conversation.id] = snapshot
+
+    for conversation_id in conversation_ids:
+        if str(conversation_id) not in found:
+            result.error(conversation_id, "Conversation not found.")
+    return result
+
+
+def bulk_forward(snapshot: SendSnapshot, sources: List[Message]) -> List[Message]:
+    """Inserts copies of `sources` into the snapshot's conversation; must run inside its transaction."""
+    conversation = snapshot.conversation
+    messages = Message.objects.bulk_create([
+        Message(
+            **source.get_content(),
+            sender=snapshot.sender,
+            conversation=conversation,
+            forwarded_from=source,
+            is_forwarded=True,
+        )
+        for source in sources
+    ])
+    # auto_now_add gives the whole batch (nearly) the same timestamp, spread it
+    # out so (created_at, id) ordering keeps the originals' order.
+    base = messages[0].created_at
+    for index, message in enumerate(messages):
+        message.created_at = base + datetime.timedelta(microseconds=index)
+    if len(messages) > 1:
+        Message.objects.bulk_update(messages, ["created_at"])
 
-    # Get existing request
-    request_qs = Request.objects.filter(
-        Q(sender=user, receiver=receiver) | Q(sender=receiver, receiver=user)
-    ).order_by("-created_at")
-    if request_qs.exists():
-        relationship = request_qs.first()
-
-        if relationship.status == "blocked":
-            # breakpoint()
-            raise PermissionDenied("You are blocked from sending messages to this user.")
-
-        elif relationship.status == "pending":
-            already_sent = Message.objects.filter(sender=user, conversation=conversation).exists()
-            if already_sent:
-                raise PermissionDenied("You can only send one message while the request is pending.")
-
-        elif relationship.status == "hidden":
-            already_sent = Message.objects.filter(sender=user, conversation=conversation).exists()
-            if already_sent:
-                raise PermissionDenied("Message request is already sent!")
-
-    # Passed validation
-    return conversation, receiver
+    seq = InboxEntry.record_message(messages[-1], count=len(messages))
+    for message in messages:
+        message.unread_seq = seq
+    ChangeLog.record_many(ChangeLog.MESSAGE, [message.id for message in messages], conversation.id)
+    if conversation.message_limit == 0:
+        Conversation.objects.filter(pk=conversation.pk, message_limit=0).update(
+            message_limit=F("message_limit") + 1,
+        )
+        conversation.message_limit += 1
+    return messages
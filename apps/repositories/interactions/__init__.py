@@ -1,30 +1,44 @@
 import requests
 import uuid 
 import logging
-from django.conf import settings
 from typing import List, Optional, Set, Any, Dict
+from services.micro.client import ServiceClient
 
 log = logging.getLogger(__name__)
 
-base_url = settings.BASE_URL
-
 class InteractionService:
 
-    def __init__(self, auth_token: str):
+    def __init__(self, auth_token: str, base_url: Optional[str] = None):
         self.headers = {
             "Authorization": f"Bearer {auth_token}"
         }
+        self.client = ServiceClient("interactions", base_url=base_url, headers=self.headers)
 
     def get_follow_request_status(self, ids: List[int]) -> List[Dict[str, str]]:
         if len(ids) != 2:
             raise ValueError("Exactly two profile IDs must be provided.")
 
         try:
-            endpoint = f"{base_url}/api/interaction/get-follow-request-status"
+            endpoint = "/api/interaction/get-follow-request-status"
             params = {"ids": ",".join(str(i) for i in ids)}
-            response = requests.get(endpoint, headers=self.headers, params=params)
+            response = self.client.get(endpoint, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             log.error(f"Failed to fetch follow request status for {ids}: {e}")
             raise
+
+    def get_follow_list(self, type: str) -> Dict[str, Any]:
+        """
+            Args:
+                type (str): `following` or `followers`.
+            Returns:
+                Dict[str, Any]: The paginated follow list of the token's user.
+        """
+        try:
+            endpoint = "/api/interaction/follow-list/"
+            response = self.client.get(endpoint, params={"type": type})
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            log.error(f"Failed to fetch {type} list: {e}")
+            raise
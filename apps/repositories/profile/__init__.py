@@ -2,15 +2,17 @@ import uuid
 import logging
 import datetime
 from apps.models import Profile
-from services import UserService
+from services import UserService, AsyncUserService
 from typing import Dict, List, Optional, Any, Set
 
 log = logging.getLogger(__name__)
 
 class ProfileRepo():
-    
+    SYNC_FIELDS = ("user_id", "first_name", "last_name", "username", "is_private")
+
     def __init__(self, token = str):
         self.service = UserService(auth_token=token)
+        self.async_service = AsyncUserService(auth_token=token)
 
     def get(self, id):
         try:
@@ -22,48 +24,55 @@ class ProfileRepo():
     def profiles_by_ids(self, ids: List) -> List[Profile]:
 
         try:
-            items = []
             profiles = self.service.get_profiles_by_ids(ids=ids)
-            print(profiles)
-            for profile in profiles:
-                data = {
+            items = [
+                {
                     "first_name": profile["first_name"],
                     "last_name": profile["last_name"],
                     "email": profile["email"],
                     "user_id": profile["id"],
                     "username": profile["username"],
-                    "online": False,
-                    "last_seen": False,
                     "is_private": profile["is_private"],
                 }
-                created_profile = self.update_or_create(data=data)
-                items.append(created_profile)
-            return items
+                for profile in profiles
+            ]
+            return self.bulk_update_or_create(items=items)
         except Exception as e:
             log.error(str(e))
             raise ValueError("Couldn't found profile with given id")
 
     def verify_user_by_token(self):
         try:
-            
             response = self.service.get_current_user().json()
+            return self.update_or_create(data=self.current_user_data(response))
+        except Exception as e:
+            log.error(str(e))
+            raise
 
-            required_keys = {"id", "first_name", "last_name", "username"}
-            if not required_keys.issubset(response):
-                raise ValueError(f"Missing required keys in response: {required_keys - response.keys()}")
-            data = {
-                "user_id": response["id"],
-                "first_name": response["first_name"],
-                "last_name": response["last_name"],
-                "email": response["email"],
-                "username": response["username"],
-            }
-            log.error(data)
-            return self.update_or_create(data=data)
+    async def averify_user_by_token(self) -> Profile:
+        """Async variant of `verify_user_by_token` that never blocks on the user service."""
+        try:
+            response = (await self.async_service.get_current_user()).json()
+            return (await self.abulk_update_or_create(items=[self.current_user_data(response)]))[0]
         except Exception as e:
             log.error(str(e))
             raise
 
+    @staticmethod
+    def current_user_data(response: Dict[str, Any]) -> Dict[str, Any]:
+        required_keys = {"id", "first_name", "last_name", "username"}
+        if not required_keys.issubset(response):
+            raise ValueError(f"Missing required keys in response: {required_keys - response.keys()}")
+        data = {
+            "user_id": response["id"],
+            "first_name": response["first_name"],
+            "last_name": response["last_name"],
+            "email": response["email"],
+            "username": response["username"],
+        }
+        log.error(data)
+        return data
+
     def update_or_create(self, data: Dict[str, str]) -> Profile:
         """
             Constructs the email data by merging the template and dynamic data.
@@ -82,14 +91,97 @@ class ProfileRepo():
             Returns:
                 Dict[str, Union[str, Dict[str, str]]]: Email data ready for sending.
         """
+        return self.bulk_update_or_create(items=[data])[0]
+
+    def bulk_update_or_create(self, items: List[Dict[str, Any]]) -> List[Profile]:
+        """
+            Upserts profiles keyed on email, writing only the rows that changed.
+
+            Existing rows are loaded with one query; new and changed rows are
+            written with a single `bulk_create(update_conflicts=True)`, so the
+            number of queries doesn't grow with the batch size.
+
+            Args:
+                items (List[Dict[str, Any]]): Profile data in the shape accepted by
+                    `update_or_create`; `is_private` is synced when present.
+            Returns:
+                List[Profile]: The stored profiles, in the same order as `items`.
+        """
         try:
-            obj, _ = Profile.objects.get_or_create(email=data["email"])
-            obj.user_id = data["user_id"]
-            obj.first_name = data["first_name"]
-            obj.last_name = data["last_name"]
-            obj.username = data["username"]
-            obj.save()
-            return obj
+            by_email = self.sync_values(items)
+            existing = {
+                profile.email: profile
+                for profile in Profile.objects.filter(email__in=by_email.keys())
+            }
+            dirty = self.apply_changes(by_email, existing)
+            if dirty:
+                created = [profile.email for profile in dirty if profile._state.adding]
+                Profile.objects.bulk_create(dirty, **self.upsert_options(by_email))
+                if created:
+                    # A concurrent sync may have inserted the same email first;
+                    # reload so callers get the primary key that was stored.
+                    existing.update(
+                        (profile.email, profile)
+                        for profile in Profile.objects.filter(email__in=created)
+                    )
+            return [existing[data["email"]] for data in items]
         except Exception as e:
             log.error(str(e))
-            raise
\ No newline at end of file
+            raise
+
+    async def abulk_update_or_create(self, items: List[Dict[str, Any]]) -> List[Profile]:
+        """Async ORM variant of `bulk_update_or_create`."""
+        try:
+            by_email = self.sync_values(items)
+            existing = {
+                profile.email: profile
+                async for profile in Profile.objects.filter(email__in=by_email.keys())
+            }
+            dirty = self.apply_changes(by_email, existing)
+            if dirty:
+                created = [profile.email for profile in dirty if profile._state.adding]
+                await Profile.objects.abulk_create(dirty, **self.upsert_options(by_email))
+                if created:
+                    existing.update([
+                        (profile.email, profile)
+                        async for profile in Profile.objects.filter(email__in=created)
+                    ])
+            return [existing[data["email"]] for data in items]
+        except Exception as e:
+            log.error(str(e))
+            raise
+
+    @classmethod
+    def sync_values(cls, items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        return {
+            data["email"]: {
+                field: str(data[field]) if field == "user_id" else data[field]
+                for field in cls.SYNC_FIELDS if field in data
+            }
+            for data in items
+        }
+
+    @staticmethod
+    def apply_changes(by_email: Dict[str, Dict[str, Any]], existing: Dict[str, Profile]) -> List[Profile]:
+        """Applies the synced values to `existing` in place and returns the rows that need writing."""
+        dirty = []
+        for email, values in by_email.items():
+            profile = existing.get(email)
+            if profile is None:
+                profile = Profile(email=email, **values)
+                existing[email] = profile
+                dirty.append(profile)
+            elif any(getattr(profile, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(profile, field, value)
+                dirty.append(profile)
+        return dirty
+
+    @staticmethod
+    def upsert_options(by_email: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        update_fields = {field for values in by_email.values() for field in values}
+        return {
+            "update_conflicts": True,
+            "unique_fields": ["email"],
+            "update_fields": [*sorted(update_fields), "updated_at"],
+        }
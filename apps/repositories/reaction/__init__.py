@@ -0,0 +1,133 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from apps.models import Message, MessageReact, Profile, Reaction
+from apps.utils.cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+reaction_cache = TTLCache(
+    maxsize=settings.REACTION_CATALOG_MAXSIZE,
+    ttl=settings.REACTION_CATALOG_TTL,
+)
+
+
+class ReactionCatalog():
+    """
+        `Reaction` rows by their text, cached in-process.
+
+        Reactions are unique and never renamed, so only a reaction seen for
+        the first time costs a query. A row deleted or re-created behind the
+        cache's back is dropped with `forget` once an insert trips over it.
+    """
+
+    def get(self, text: str) -> Reaction:
+        reaction = reaction_cache.get(text)
+        if reaction is None:
+            reaction, _ = Reaction.objects.get_or_create(reaction=text)
+            reaction_cache.set(text, reaction)
+        return reaction
+
+    def forget(self, text: str) -> None:
+        reaction_cache.delete(text)
+
+
+class ReactionRepo():
+    """
+        Idempotent reactions of one profile.
+
+        Adding a reaction that is already there and removing one that isn't
+        are no-ops, so double taps never create duplicate rows or skew
+        `Message.reaction_summary`.
+
+        Args:
+            profile (Profile): The reacting profile.
+    """
+    ADDED = "added"
+    REMOVED = "removed"
+
+    def __init__(self, profile: Profile, catalog: Optional[ReactionCatalog] = None):
+        self.profile = profile
+        self.catalog = catalog or ReactionCatalog()
+
+    def get_message(self, message_id: Any) -> Message:
+        """
+            Raises:
+                Message.DoesNotExist: No active message with this id in a conversation of the profile.
+        """
+        return Message.objects.only("id", "conversation_id", "reaction_summary").get(
+            id=message_id,
+            is_active=True,
+            conversation__profiles=self.profile,
+        )
+
+    def add(self, message: Message, text: str) -> Tuple[MessageReact, bool]:
+        """
+            Returns:
+                Tuple[MessageReact, bool]: The reaction and whether it was added now.
+        """
+        try:
+            return self.add_reaction(message, self.catalog.get(text))
+        except IntegrityError:
+            # Most likely a cached Reaction whose row is gone, retry with a fresh one.
+            self.catalog.forget(text)
+            return self.add_reaction(message, self.catalog.get(text))
+
+    def add_reaction(self, message: Message, reaction: Reaction) -> Tuple[MessageReact, bool]:
+        with transaction.atomic():
+            react, created = MessageReact.objects.get_or_create(
+                message=message,
+                reacted_by=self.profile,
+                reaction=reaction,
+            )
+            if not created and not react.is_active:
+                react.is_active = True
+                react.save()
+                created = True
+        return react, created
+
+    def remove(self, message: Message, text: str) -> Optional[MessageReact]:
+        """Deletes the profile's `text` reaction on `message`, returns it or None when there was none."""
+        with transaction.atomic():
+            react = MessageReact.objects.select_for_update(of=("self",)).select_related("reaction").filter(
+                message=message,
+                reacted_by=self.profile,
+                reaction__reaction=text,
+                is_active=True,
+            ).first()
+            if react is None:
+                return None
+            react.delete()
+        return react
+
+    def toggle(self, message: Message, text: str) -> Tuple[MessageReact, str]:
+        """
+            Removes the reaction if the profile has it, adds it otherwise.
+
+            Returns:
+                Tuple[MessageReact, str]: The reaction and `ADDED` or `REMOVED`.
+        """
+        react = self.remove(message, text)
+        if react is not None:
+            return react, self.REMOVED
+        react, _ = self.add(message, text)
+        return react, self.ADDED
+
+    @staticmethod
+    def summary(react: MessageReact, message: Message) -> List[Dict[str, Any]]:
+        """The message's summary after the change, or as loaded when nothing changed."""
+        return getattr(react, "summary", message.reaction_summary)
+
+    def event(self, react: MessageReact, message: Message, action: str) -> Dict[str, Any]:
+        """Delta sent to the conversation members, see `apps.celery_tasks.send_reaction`."""
+        return {
+            "message": str(message.id),
+            "conversation": str(message.conversation_id),
+            "reaction": react.reaction.reaction,
+            "reacted_by": str(self.profile.id),
+            "action": action,
+            "reaction_summary": self.summary(react, message),
+        }
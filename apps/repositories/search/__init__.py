@@ -0,0 +1,72 @@
+import logging
+from typing import Any, Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVectorField
+from django.db import connection
+from django.db.models import F, FloatField, QuerySet, Value
+from django.db.models.functions import Cast
+from django.db.models.expressions import RawSQL
+
+from apps.models import Message, Profile
+
+log = logging.getLogger(__name__)
+
+
+class MessageSearch():
+    """
+        Full-text search over the messages of the conversations a profile belongs to.
+
+        On PostgreSQL it matches against `apps_message.search_vector`, a stored
+        tsvector generated from `content` (kept current by the database on every
+        insert/update) with a GIN index, and ranks/highlights with
+        `ts_rank`/`ts_headline`. Other backends fall back to a case-insensitive
+        substring match with a constant rank, for local development.
+
+        Args:
+            profile (Profile): The searching profile.
+    """
+    HIGHLIGHT_START = "<mark>"
+    HIGHLIGHT_STOP = "</mark>"
+
+    def __init__(self, profile: Profile):
+        self.profile = profile
+        self.config = settings.MESSAGE_SEARCH_CONFIG
+
+    def messages(self, conversation_id: Optional[Any] = None) -> QuerySet:
+        messages = Message.objects.filter(is_active=True, conversation__profiles=self.profile)
+        if conversation_id:
+            messages = messages.filter(conversation_id=conversation_id)
+        return messages.select_related("sender")
+
+    def search(self, text: str, conversation_id: Optional[Any] = None) -> QuerySet:
+        """
+            Returns:
+                QuerySet: Matching messages annotated with `rank` and `headline`,
+                best match first.
+        """
+        messages = self.messages(conversation_id)
+        if connection.vendor != "postgresql":
+            return messages.filter(content__icontains=text).annotate(
+                rank=Value(0.0, output_field=FloatField()),
+                headline=F("content"),
+            ).order_by("-rank", "-id")
+
+        query = SearchQuery(text, config=self.config, search_type="websearch")
+        vector = RawSQL('"apps_message"."search_vector"', [], output_field=SearchVectorField())
+        return messages.annotate(
+            search=vector,
+        ).filter(
+            search=query,
+        ).annotate(
+            # ts_rank is a real; as double precision the value round-trips
+            # through the cursor exactly and compares equal to itself.
+            rank=Cast(SearchRank(vector, query), FloatField()),
+            headline=SearchHeadline(
+                "content",
+                query,
+                config=self.config,
+                start_sel=self.HIGHLIGHT_START,
+                stop_sel=self.HIGHLIGHT_STOP,
+            ),
+        ).order_by("-rank", "-id")
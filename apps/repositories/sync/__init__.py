@@ -0,0 +1,184 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import Q, QuerySet
+
+from apps.models import (ChangeLog, Conversation, ConversationSettings, InboxEntry, Message,
+                         MessageArchive, Profile, Request)
+
+log = logging.getLogger(__name__)
+
+
+class SyncExpired(Exception):
+    """The client's sequence number is older than the retained change log."""
+
+
+class ChangeSet:
+    """
+        Current state of everything that changed after a sequence number.
+
+        Several changes of one object collapse into one entry.
+
+        Args:
+            seq (int): Sequence number to resume from next time.
+            has_more (bool): More changes are left after `seq`.
+    """
+
+    def __init__(self, seq: int, has_more: bool):
+        self.seq = seq
+        self.has_more = has_more
+        self.messages: List[Message] = []
+        self.deleted_messages: List[Any] = []
+        self.reactions: Dict[str, List[Dict[str, Any]]] = {}
+        self.read: List[Dict[str, Any]] = []
+        self.settings: List[ConversationSettings] = []
+        self.requests: List[Request] = []
+        self.deleted_requests: List[Any] = []
+
+
+class ChangeFeed():
+    """
+        Reads the `ChangeLog` of one profile for delta sync.
+
+        On Postgres rows are served in writing-transaction order, and only
+        those of transactions older than every one still running: once
+        handed out, nothing can commit below them, so a client moving past a
+        seq never skips a late commit. A transaction left open holds the feed
+        back until it ends. Pages end on a transaction boundary.
+
+        Args:
+            profile (Profile): The syncing profile.
+    """
+    default_limit = 500
+    max_limit = 2000
+
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    @staticmethod
+    def horizon() -> Optional[int]:
+        """Oldest transaction still running on Postgres, None on other backends."""
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+            return cursor.fetchone()[0]
+
+    def changes(self, since: int, horizon: Optional[int]) -> QuerySet:
+        """Final change rows after `since` in the profile's conversations or addressed to it, oldest first."""
+        position = ChangeLog.position_field()
+        conversation_ids = Conversation.profiles.through.objects.filter(
+            profile_id=self.profile.id,
+        ).values("conversation_id")
+        rows = ChangeLog.objects.filter(
+            Q(conversation_id__in=conversation_ids) | Q(profile_id=self.profile.id),
+            **{f"{position}__gt": since},
+        )
+        if horizon is not None:
+            rows = rows.filter(txid__lt=horizon)
+        return rows.order_by(position, "id")
+
+    def check_retained(self, since: int) -> None:
+        """
+            Raises:
+                SyncExpired: Rows after `since` may have been pruned.
+        """
+        if not since:
+            return
+        position = ChangeLog.position_field()
+        oldest = ChangeLog.objects.filter(**{f"{position}__isnull": False}).order_by(position).values_list(
+            position, flat=True,
+        ).first()
+        # `since` is the position of a row served earlier, so it is only missing once pruned.
+        if oldest is not None and since < oldest:
+            raise SyncExpired(f"Changes before {oldest} are no longer kept, sync from scratch.")
+
+    def read(self, since: int, limit: int) -> Tuple[List[tuple], bool]:
+        """
+            Returns:
+                Tuple[List[tuple], bool]: (position, kind, object_id, conversation_id)
+                rows of whole transactions, at most `limit` unless one transaction is
+                larger, and whether more are left.
+        """
+        horizon = self.horizon()
+        fields = (ChangeLog.position_field(), "kind", "object_id", "conversation_id")
+        rows = list(self.changes(since, horizon).values_list(*fields)[:limit + 1])
+        if len(rows) <= limit:
+            return rows, False
+        cut = rows[limit][0]
+        rows = [row for row in rows[:limit] if row[0] != cut]
+        if rows:
+            return rows, True
+        # One transaction larger than a page is served whole.
+        rows = list(self.changes(since, horizon).filter(**{fields[0]: cut}).values_list(*fields))
+        return rows, self.changes(cut, horizon).exists()
+
+    def load(self, since: int = 0, limit: Optional[int] = None) -> ChangeSet:
+        """
+            Args:
+                since (int): Last sequence number the client has applied, 0 for all retained changes.
+                limit (int): Maximum change rows to read, a larger transaction is still read whole.
+            Returns:
+                ChangeSet: The collapsed changes; resume from `ChangeSet.seq`.
+            Raises:
+                SyncExpired: `since` is older than the retained change log.
+        """
+        limit = max(1, min(limit or self.default_limit, self.max_limit))
+        self.check_retained(since)
+
+        rows, has_more = self.read(since, limit)
+        changes = ChangeSet(rows[-1][0] if rows else since, has_more)
+
+        touched: Dict[str, set] = {kind: set() for kind, _ in ChangeLog.KINDS}
+        read = set()
+        for _, kind, object_id, conversation_id in rows:
+            if kind == ChangeLog.READ:
+                read.add((conversation_id, object_id))
+            else:
+                touched[kind].add(object_id)
+
+        self.load_messages(changes, touched[ChangeLog.MESSAGE], touched[ChangeLog.REACTION])
+        self.load_read(changes, read)
+        changes.settings = list(ConversationSettings.objects.filter(
+            id__in=touched[ChangeLog.SETTINGS],
+            profile=self.profile,
+        ))
+        changes.requests = list(Request.objects.filter(id__in=touched[ChangeLog.REQUEST]))
+        changes.deleted_requests = list(touched[ChangeLog.REQUEST] - {request.id for request in changes.requests})
+        return changes
+
+    @staticmethod
+    def load_messages(changes: ChangeSet, message_ids: set, reacted_ids: set) -> None:
+        """Changed messages in full, reactions only as summaries unless the message is sent anyway."""
+        found = set()
+        for message in Message.objects.filter(id__in=message_ids).prefetch_related("file"):
+            found.add(message.id)
+            if message.is_active:
+                changes.messages.append(message)
+            else:
+                changes.deleted_messages.append(message.id)
+
+        missing = message_ids - found
+        if missing:
+            # Archived since the change was recorded, not deleted.
+            missing -= set(MessageArchive.objects.filter(id__in=missing).values_list("id", flat=True))
+            changes.deleted_messages.extend(missing)
+
+        summaries = Message.objects.filter(
+            id__in=reacted_ids - message_ids,
+            is_active=True,
+        ).values_list("id", "reaction_summary")
+        changes.reactions = {str(message_id): summary for message_id, summary in summaries}
+
+    @staticmethod
+    def load_read(changes: ChangeSet, read: set) -> None:
+        if not read:
+            return
+        entries = InboxEntry.objects.filter(
+            conversation_id__in={conversation_id for conversation_id, _ in read},
+            profile_id__in={profile_id for _, profile_id in read},
+        ).values("conversation_id", "profile_id", "last_read_message_id", "last_read_at")
+        changes.read = [
+            entry for entry in entries if (entry["conversation_id"], entry["profile_id"]) in read
+        ]
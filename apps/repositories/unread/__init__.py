@@ -0,0 +1,215 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+import redis
+from django.conf import settings
+
+from apps.models import InboxEntry
+
+log = logging.getLogger(__name__)
+
+BUILT_FIELD = "__built__"
+TOTAL_FIELD = "__total__"
+SEQ_PREFIX = "seq:"
+PENDING_PREFIX = "pending:"
+# Parked increments only matter to a rebuild that is already reading the DB.
+PENDING_TTL = 60
+
+# A built hash keeps, per conversation, the `InboxEntry.unread_seq` it was
+# built from under `seq:<conversation>`: sends up to that seq are already in
+# the count, so only later ones are added. Until the hash is built increments
+# are parked as `pending:<conversation>:<seq>` for the rebuild to merge.
+# ARGV: conversation, amount, seq ('' when unknown), ttl, pending ttl.
+INCREMENT_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '__built__') == 1 then
+    local covered = tonumber(redis.call('HGET', KEYS[1], 'seq:' .. ARGV[1]) or '0')
+    if ARGV[3] == '' or tonumber(ARGV[3]) > covered then
+        redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+        redis.call('HINCRBY', KEYS[1], '__total__', ARGV[2])
+    end
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+elseif ARGV[3] ~= '' then
+    redis.call('HINCRBY', KEYS[1], 'pending:' .. ARGV[1] .. ':' .. ARGV[3], ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+end
+return 1
+"""
+
+RESET_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '__built__') == 1 then
+    local count = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('HINCRBY', KEYS[1], '__total__', -count)
+end
+return 1
+"""
+
+# Builds the hash from the InboxEntry rows read by the caller, adding the
+# parked increments of sends the rows don't cover yet. A hash built meanwhile
+# by another reader is kept as is. ARGV: ttl, then (conversation, unread
+# count, unread seq) triples.
+REBUILD_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '__built__') == 0 then
+    local counts, covered = {}, {}
+    for i = 2, #ARGV, 3 do
+        counts[ARGV[i]] = tonumber(ARGV[i + 1])
+        covered[ARGV[i]] = tonumber(ARGV[i + 2])
+    end
+    local parked = redis.call('HGETALL', KEYS[1])
+    for i = 1, #parked, 2 do
+        local conversation, seq = string.match(parked[i], '^pending:(.+):(%d+)$')
+        if conversation and tonumber(seq) > (covered[conversation] or 0) then
+            counts[conversation] = (counts[conversation] or 0) + tonumber(parked[i + 1])
+        end
+    end
+    redis.call('DEL', KEYS[1])
+    local total = 0
+    for conversation, count in pairs(counts) do
+        if count > 0 then
+            redis.call('HSET', KEYS[1], conversation, count)
+            total = total + count
+        end
+    end
+    for conversation, seq in pairs(covered) do
+        redis.call('HSET', KEYS[1], 'seq:' .. conversation, seq)
+    end
+    redis.call('HSET', KEYS[1], '__built__', 1, '__total__', total)
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return redis.call('HGETALL', KEYS[1])
+"""
+
+_client: Optional[redis.Redis] = None
+
+
+def get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.UNREAD_REDIS_URL,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+        )
+    return _client
+
+
+class UnreadCounter():
+    """
+        Per-profile unread counters kept in a Redis hash.
+
+        `unread:<profile_id>` maps conversation ids to unread counts and keeps
+        the profile's badge total in `__total__`, so both reads are O(1). The
+        hash is rebuilt from the InboxEntry rows whenever it is missing.
+
+        Increments run after the send committed, so a rebuild may already have
+        counted them; each carries the send's `Conversation.message_seq` and is
+        skipped when the rebuilt entry covers it.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None):
+        self.client = client or get_client()
+        self.increment_script = self.client.register_script(INCREMENT_SCRIPT)
+        self.reset_script = self.client.register_script(RESET_SCRIPT)
+        self.rebuild_script = self.client.register_script(REBUILD_SCRIPT)
+
+    @staticmethod
+    def key(profile_id: Any) -> str:
+        return f"unread:{profile_id}"
+
+    @staticmethod
+    def increment_args(conversation_id: Any, amount: int, seq: Optional[int]) -> List[Any]:
+        return [
+            str(conversation_id), amount, "" if seq is None else seq,
+            settings.UNREAD_COUNTER_TTL, PENDING_TTL,
+        ]
+
+    def increment(self, profile_id: Any, conversation_id: Any, amount: int = 1, seq: Optional[int] = None) -> None:
+        """
+            Args:
+                seq (int): `Conversation.message_seq` of the send, see `InboxEntry.record_message`.
+        """
+        try:
+            self.increment_script(
+                keys=[self.key(profile_id)], args=self.increment_args(conversation_id, amount, seq),
+            )
+        except redis.RedisError as e:
+            log.warning(f"Couldn't increment unread counter for {profile_id}: {e}")
+
+    def increment_many(self, profile_ids: List[Any], conversation_id: Any, amount: int = 1,
+                       seq: Optional[int] = None) -> None:
+        """`increment` for every profile of a room, in one pipelined round trip."""
+        if not profile_ids:
+            return
+        args = self.increment_args(conversation_id, amount, seq)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for profile_id in profile_ids:
+                self.increment_script(keys=[self.key(profile_id)], args=args, client=pipe)
+            pipe.execute()
+        except redis.RedisError as e:
+            log.warning(f"Couldn't increment unread counters of conversation {conversation_id}: {e}")
+
+    def reset(self, profile_id: Any, conversation_id: Any) -> None:
+        try:
+            self.reset_script(keys=[self.key(profile_id)], args=[str(conversation_id)])
+        except redis.RedisError as e:
+            log.warning(f"Couldn't reset unread counter for {profile_id}: {e}")
+
+    @staticmethod
+    def parse(raw: Dict[bytes, bytes]) -> Dict[str, int]:
+        """Counts of a built hash, without its bookkeeping fields."""
+        counts = {}
+        for field, value in raw.items():
+            field = field.decode()
+            if field == BUILT_FIELD or field.startswith((SEQ_PREFIX, PENDING_PREFIX)):
+                continue
+            counts[field] = int(value)
+        return counts
+
+    def rebuild(self, profile_id: Any) -> Dict[str, int]:
+        entries = InboxEntry.objects.filter(
+            profile_id=profile_id,
+            conversation__is_active=True,
+        ).exclude(unread_count=0, unread_seq=0).values_list("conversation_id", "unread_count", "unread_seq")
+        args = [settings.UNREAD_COUNTER_TTL]
+        counts = {}
+        for conversation_id, unread_count, unread_seq in entries:
+            args.extend([str(conversation_id), unread_count, unread_seq])
+            if unread_count > 0:
+                counts[str(conversation_id)] = unread_count
+        try:
+            raw = self.rebuild_script(keys=[self.key(profile_id)], args=args)
+        except redis.RedisError as e:
+            log.warning(f"Couldn't rebuild unread counters for {profile_id}: {e}")
+            return counts
+        counts = self.parse(dict(zip(raw[::2], raw[1::2])))
+        counts.pop(TOTAL_FIELD, None)
+        return {field: count for field, count in counts.items() if count > 0}
+
+    def counts(self, profile_id: Any) -> Dict[str, int]:
+        """
+            Returns:
+                Dict[str, int]: Unread count per conversation id, plus the badge
+                total under `__total__`.
+        """
+        try:
+            raw = self.client.hgetall(self.key(profile_id))
+        except redis.RedisError as e:
+            log.warning(f"Unread counters unavailable: {e}")
+            raw = {}
+        if BUILT_FIELD.encode() not in raw:
+            counts = self.rebuild(profile_id)
+            return {**counts, TOTAL_FIELD: sum(counts.values())}
+
+        counts = self.parse(raw)
+        return {field: count for field, count in counts.items() if count > 0 or field == TOTAL_FIELD}
+
+    def total(self, profile_id: Any) -> int:
+        try:
+            total = self.client.hget(self.key(profile_id), TOTAL_FIELD)
+        except redis.RedisError as e:
+            log.warning(f"Unread counters unavailable: {e}")
+            total = None
+        if total is None:
+            return sum(self.rebuild(profile_id).values())
+        return max(int(total), 0)
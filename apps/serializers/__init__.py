@@ -1,6 +1,9 @@
 from .chat import (
     MessageSerializer,
+    MessageThreadSerializer,
     MessageInfoSerializer,
+    MessageArchiveSerializer,
+    MessageSearchSerializer,
     ConversationSerializer,
     ConversationInfoSerializer,
     ConversationSettingsSerializer,
@@ -15,3 +18,4 @@ from .chat import (
     AttachmentSerializer,
     RequestInfoSerializer,
 )
+from .loaders import ConversationPageLoader, ReadWatermarks
@@ -5,14 +5,33 @@ from django.http import HttpRequest
 from django.urls import reverse
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Count
 from rest_framework import serializers
 
 from .. import models
+from .loaders import ReadWatermarks
 
 log = logging.getLogger(__name__)
 
 
+def get_page_loader(serializer, obj):
+    """Returns the ConversationPageLoader from the context when it loaded `obj`'s conversation."""
+    loader = serializer.context.get("page_loader")
+    if loader is None:
+        return None
+    if isinstance(obj, models.Message):
+        return loader if loader.has_message(obj) else None
+    return loader if loader.has(obj) else None
+
+
+def get_read_watermarks(serializer, message) -> ReadWatermarks:
+    """Returns the read watermarks covering `message`'s conversation, loading them if the context has none."""
+    loader = serializer.context.get("page_loader")
+    for watermarks in (serializer.context.get("read_watermarks"), getattr(loader, "watermarks", None)):
+        if watermarks is not None and watermarks.has(message):
+            return watermarks
+    return ReadWatermarks().load([message.conversation_id])
+
+
 class AttachmentSerializer(serializers.ModelSerializer):
     field_name = serializers.CharField(write_only=True, required=False, default='Attachment')  
 
@@ -85,16 +104,22 @@ class ConversationSerializer(serializers.ModelSerializer):
         if not request or not request.user:
             return None
 
-        user_profile = request.user
-        if obj.messages.filter(is_active=True, is_read=False).exists():
-            return obj.messages.filter(is_active=True, is_read=False).exclude(sender__id=user_profile.id).count()
-        return 0
+        loader = get_page_loader(self, obj)
+        if loader:
+            return loader.unread_count(obj)
+
+        entry = models.InboxEntry.objects.filter(conversation=obj, profile=request.user).first()
+        return entry.unread_messages().count() if entry else 0
     
     def get_requests(self, obj):
         request = self.context.get("request")
         if not request or not request.user:
             return None
 
+        loader = get_page_loader(self, obj)
+        if loader:
+            return RequestSerializer(loader.requests_with(obj), many=True).data
+
         user_profile = request.user
         other_profiles = obj.profiles.exclude(id=user_profile.id)
         sent_requests = models.Request.objects.filter(sender=user_profile, receiver__in=other_profiles).exclude(status="deleted")
@@ -103,13 +128,22 @@ class ConversationSerializer(serializers.ModelSerializer):
         return RequestSerializer(all_requests, many=True).data
 
     def get_last_message(self, obj):
+        loader = get_page_loader(self, obj)
+        if loader:
+            message = loader.last_message(obj)
+            return MessageSerializer(message, context=self.context).data if message else []
+
         if obj.messages.filter(is_active=True).exists():
             return MessageSerializer(
-                obj.messages.filter(is_active=True).order_by("-created_at").first()
+                obj.messages.filter(is_active=True).order_by("-created_at").first(),
+                context=self.context,
             ).data
         return []
     def get_settings(self, obj):
         request = self.context.get("request")
+        loader = get_page_loader(self, obj)
+        if loader:
+            return ConversationSettingsSerializer(loader.settings_for(obj, own=False), many=True).data
         if request and request.user:
             return ConversationSettingsSerializer(
                 obj.settings.exclude(profile=request.user),
@@ -123,12 +157,11 @@ class MessageInfoForLastMessageSerializer(serializers.ModelSerializer):
     sender = ProfileSerializer()
     conversation = ConversationSerializer()
     file = AttachmentInfoSerializer(many=True)
-    reaction_summary = serializers.SerializerMethodField()
-    def get_reaction_summary(self, obj):
-        """Counts reactions per message and returns the list"""
+    is_read = serializers.SerializerMethodField()
+
+    def get_is_read(self, obj):
+        return get_read_watermarks(self, obj).is_read(obj)
 
-        reactions = obj.message_reaction.values("reaction__reaction").annotate(count=Count("id")).order_by("-count")
-        return [{"reaction": r["reaction__reaction"], "count": r["count"]} for r in reactions]
     class Meta:
         model = models.Message
         depth = 1
@@ -145,20 +178,36 @@ class ConversationInfoSerializer(serializers.ModelSerializer):
         if not request or not request.user:
             return None
 
-        user_profile = request.user
-        if obj.messages.filter(is_active=True, is_read=False).exists():
-            return obj.messages.filter(is_active=True, is_read=False).exclude(sender__id=user_profile.id).count()
-        return 0
+        loader = get_page_loader(self, obj)
+        if loader:
+            return loader.unread_count(obj)
+
+        # Annotated from the caller's inbox entry by ConversationRepo.for_profile
+        if getattr(obj, "unread_count", None) is not None:
+            return obj.unread_count
+
+        entry = models.InboxEntry.objects.filter(conversation=obj, profile=request.user).first()
+        return entry.unread_messages().count() if entry else 0
     
     def get_last_message(self, obj):
+        loader = get_page_loader(self, obj)
+        if loader:
+            message = loader.last_message(obj)
+            return MessageInfoForLastMessageSerializer(message, context=self.context).data if message else []
+
         if obj.messages.filter(is_active=True).exists():
             return MessageInfoForLastMessageSerializer(
-                obj.messages.filter(is_active=True).order_by("-created_at").first()
+                obj.messages.filter(is_active=True).order_by("-created_at").first(),
+                context=self.context,
             ).data
         return []
     
     def get_requests(self, obj):
         request = self.context.get("request")
+        loader = get_page_loader(self, obj)
+        if loader:
+            return RequestSerializer(loader.requests_with(obj, first_only=True), many=True).data
+
         other_profile = obj.profiles.exclude(id=request.user.id).first()
 
         sent_requests = models.Request.objects.filter(sender = request.user, receiver = other_profile).exclude(status="deleted")
@@ -169,6 +218,9 @@ class ConversationInfoSerializer(serializers.ModelSerializer):
         
     def get_settings(self, obj):
         request = self.context.get("request")
+        loader = get_page_loader(self, obj)
+        if loader:
+            return ConversationSettingsInfoSerializer(loader.settings_for(obj, own=True), many=True).data
 
         if request and request.user:
             return ConversationSettingsInfoSerializer(
@@ -201,34 +253,72 @@ class FollowerInfoSerializer(serializers.ModelSerializer):
 class MessageSerializer(serializers.ModelSerializer):
     # sender = ProfileSerializer()
     # conversation = ConversationSerializer()
-    reaction_summary = serializers.SerializerMethodField()
-    def get_reaction_summary(self, obj):
-        """Counts reactions per message and returns the list"""
+    is_read = serializers.SerializerMethodField()
 
-        reactions = obj.message_reaction.values("reaction__reaction").annotate(count=Count("id")).order_by("-count")
-        return [{"reaction": r["reaction__reaction"], "count": r["count"]} for r in reactions]
+    def get_is_read(self, obj):
+        return get_read_watermarks(self, obj).is_read(obj)
 
     class Meta:
         model = models.Message
         fields = "__all__"
+        # A repeated (sender, client_message_id) is a replay, answered by
+        # `send_message` with the stored message instead of a 400.
+        validators = []
+
+
+class MessageThreadSerializer(MessageSerializer):
+    """A message of a reply subtree, with its distance from the thread root."""
+    depth = serializers.IntegerField(read_only=True)
 
 
 class MessageInfoSerializer(serializers.ModelSerializer):
     sender = ProfileSerializer()
     conversation = ConversationSerializer()
     file = AttachmentInfoSerializer(many=True)
-    reaction_summary = serializers.SerializerMethodField()
-    def get_reaction_summary(self, obj):
-        """Counts reactions per message and returns the list"""
+    is_read = serializers.SerializerMethodField()
+
+    def get_is_read(self, obj):
+        return get_read_watermarks(self, obj).is_read(obj)
 
-        reactions = obj.message_reaction.values("reaction__reaction").annotate(count=Count("id")).order_by("-count")
-        return [{"reaction": r["reaction__reaction"], "count": r["count"]} for r in reactions]
     class Meta:
         model = models.Message
         depth = 1
         fields = "__all__"
 
 
+class MessageArchiveSerializer(serializers.ModelSerializer):
+    """Archived messages as returned by the message list once it runs past the hot table."""
+    parent = serializers.UUIDField(source="parent_id", read_only=True)
+    forwarded_from = serializers.UUIDField(source="forwarded_from_id", read_only=True)
+    file = serializers.ListField(source="file_ids", read_only=True)
+    is_read = serializers.SerializerMethodField()
+    is_archived = serializers.SerializerMethodField()
+
+    def get_is_read(self, obj):
+        return get_read_watermarks(self, obj).is_read(obj)
+
+    def get_is_archived(self, obj):
+        return True
+
+    class Meta:
+        model = models.MessageArchive
+        fields = [
+            "id", "created_at", "updated_at", "is_active", "conversation", "sender",
+            "parent", "forwarded_from", "content", "is_forwarded", "file",
+            "reaction_summary", "is_read", "is_archived",
+        ]
+
+
+class MessageSearchSerializer(serializers.ModelSerializer):
+    sender = ProfileSerializer()
+    rank = serializers.FloatField()
+    headline = serializers.CharField()
+
+    class Meta:
+        model = models.Message
+        fields = ["id", "conversation", "sender", "content", "created_at", "rank", "headline"]
+
+
 class MessageReactSerializer(serializers.ModelSerializer):
     # sender = ProfileSerializer()
     # conversation = ConversationSerializer()
@@ -0,0 +1,156 @@
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db.models import prefetch_related_objects
+
+from .. import models
+
+log = logging.getLogger(__name__)
+
+
+class ReadWatermarks:
+    """
+        Last-read times of the members of some conversations.
+
+        `Message.is_read` is derived from them: a message is read once every
+        member other than its sender has read past it.
+    """
+
+    def __init__(self):
+        self.watermarks: Dict[Any, Dict[Any, Any]] = {}
+
+    def add(self, conversation_id, profile_id, last_read_at) -> None:
+        self.watermarks.setdefault(conversation_id, {})[profile_id] = last_read_at
+
+    def load(self, conversation_ids: Iterable[Any]) -> "ReadWatermarks":
+        entries = models.InboxEntry.objects.filter(
+            conversation_id__in=set(conversation_ids),
+        ).values_list("conversation_id", "profile_id", "last_read_at")
+        for conversation_id, profile_id, last_read_at in entries:
+            self.add(conversation_id, profile_id, last_read_at)
+        return self
+
+    def has(self, message: models.Message) -> bool:
+        return message.conversation_id in self.watermarks
+
+    def is_read(self, message: models.Message) -> bool:
+        others = [
+            last_read_at
+            for profile_id, last_read_at in self.watermarks.get(message.conversation_id, {}).items()
+            if profile_id != message.sender_id
+        ]
+        return bool(others) and all(
+            last_read_at is not None and last_read_at >= message.created_at for last_read_at in others
+        )
+
+
+class ConversationPageLoader:
+    """
+        Loads everything the conversation serializers need for one page in batches.
+
+        Unread counts, last messages (with sender and attachments), requests and settings for all conversations of the page
+        are fetched with a constant number of queries. The loader is passed
+        to the serializers as `context["page_loader"]`; conversations it
+        didn't load fall back to the per-row queries.
+
+        Args:
+            profile (Profile): The profile the page is rendered for.
+    """
+
+    def __init__(self, profile: models.Profile):
+        self.profile = profile
+        self.conversations: Dict[Any, models.Conversation] = {}
+        self.unread_counts: Dict[Any, int] = {}
+        self.last_messages: Dict[Any, models.Message] = {}
+        self.message_ids = set()
+        self.requests: Dict[Any, List[models.Request]] = defaultdict(list)
+        self.settings: Dict[Any, List[models.ConversationSettings]] = defaultdict(list)
+        self.watermarks = ReadWatermarks()
+
+    def load(self, conversations: Iterable[models.Conversation]) -> "ConversationPageLoader":
+        conversations = list(conversations)
+        if not conversations:
+            return self
+        prefetch_related_objects(conversations, "profiles")
+        self.conversations = {conversation.id: conversation for conversation in conversations}
+
+        entries = models.InboxEntry.objects.filter(
+            conversation_id__in=self.conversations,
+        ).values_list("conversation_id", "profile_id", "unread_count", "last_message_id", "last_read_at")
+        last_message_ids = {}
+        for conversation_id, profile_id, unread_count, last_message_id, last_read_at in entries:
+            self.watermarks.add(conversation_id, profile_id, last_read_at)
+            if profile_id != self.profile.id:
+                continue
+            self.unread_counts[conversation_id] = unread_count
+            if last_message_id:
+                last_message_ids[last_message_id] = conversation_id
+
+        messages = models.Message.objects.filter(
+            id__in=last_message_ids,
+            is_active=True,
+        ).select_related(
+            "sender", "parent", "forwarded_from",
+        ).prefetch_related(
+            "file", "parent__file", "forwarded_from__file",
+        )
+        for message in messages:
+            message.conversation = self.conversations[message.conversation_id]
+            self.last_messages[message.conversation_id] = message
+            self.message_ids.add(message.id)
+
+        members = {
+            conversation.id: {profile.id for profile in conversation.profiles.all()}
+            for conversation in conversations
+        }
+        other_ids = set().union(*members.values()) - {self.profile.id}
+        requests = models.Request.objects.filter(
+            pair_key__in=[models.make_pair_key(self.profile.id, other_id) for other_id in other_ids]
+        ).exclude(status="deleted")
+        for request in requests:
+            other_id = request.receiver_id if request.sender_id == self.profile.id else request.sender_id
+            for conversation_id, member_ids in members.items():
+                if other_id in member_ids:
+                    self.requests[conversation_id].append(request)
+
+        settings = models.ConversationSettings.objects.filter(
+            conversation_id__in=self.conversations,
+        ).select_related("profile")
+        for item in settings:
+            item.conversation = self.conversations[item.conversation_id]
+            self.settings[item.conversation_id].append(item)
+        return self
+
+    def has(self, conversation: models.Conversation) -> bool:
+        return conversation.id in self.conversations
+
+    def has_message(self, message: models.Message) -> bool:
+        return message.id in self.message_ids
+
+    def unread_count(self, conversation: models.Conversation) -> int:
+        return self.unread_counts.get(conversation.id, 0)
+
+    def last_message(self, conversation: models.Conversation) -> Optional[models.Message]:
+        return self.last_messages.get(conversation.id)
+
+    def other_profile_ids(self, conversation: models.Conversation) -> List[Any]:
+        return sorted(
+            profile.id for profile in conversation.profiles.all() if profile.id != self.profile.id
+        )
+
+    def requests_with(self, conversation: models.Conversation, first_only: bool = False) -> List[models.Request]:
+        """Requests between the profile and the other members, or only the first of them."""
+        requests = self.requests.get(conversation.id, [])
+        if not first_only:
+            return requests
+        others = self.other_profile_ids(conversation)
+        if not others:
+            return []
+        return [r for r in requests if others[0] in (r.sender_id, r.receiver_id)]
+
+    def settings_for(self, conversation: models.Conversation, own: bool) -> List[models.ConversationSettings]:
+        return [
+            item for item in self.settings.get(conversation.id, [])
+            if (item.profile_id == self.profile.id) == own
+        ]
@@ -1,3 +1,498 @@
-from django.test import TestCase
+import asyncio
+import base64
+import copy
+import json
+import uuid
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.management.commands.explain_hot_queries import Command as ExplainHotQueries
+from apps.models import (ChangeLog, Conversation, ConversationSettings, Message, MessageReact, Profile,
+                         Reaction, Request)
+from apps.repositories import ProfileRepo
+from apps.repositories.reaction import reaction_cache
+from websockets.sockets import SocketConsumer
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def make_profile(name: str) -> Profile:
+    return Profile.objects.create(user_id=name, first_name=name, email=f"{name}@example.com")
+
+
+def make_conversation(*profiles: Profile, room_type: str = Conversation.PRIVATE) -> Conversation:
+    conversation = Conversation.objects.create(room_type=room_type)
+    conversation.profiles.add(*profiles)
+    conversation.save()
+    return conversation
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ConversationListQueriesTests(TestCase):
+    """
+        The conversation list costs the same number of queries whatever the inbox size:
+        conversations, members, inbox entries, requests and settings of the page.
+    """
+    LIST_QUERIES = 5
+
+    def setUp(self):
+        self.profile = make_profile("owner")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.profile)
+
+    def add_conversations(self, count: int, status: str = None) -> None:
+        start = Profile.objects.count()
+        for index in range(start, start + count):
+            peer = make_profile(f"peer{index}")
+            if status:
+                Request.objects.create(sender=self.profile, receiver=peer, status=status)
+            make_conversation(self.profile, peer)
+
+    def list_conversations(self, **params):
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get(reverse("conversation-list"), {"limit": 100, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_one_conversation(self):
+        self.add_conversations(1)
+        self.assertEqual(len(self.list_conversations()), 1)
+
+    def test_many_conversations(self):
+        self.add_conversations(40)
+        self.assertEqual(len(self.list_conversations()), 40)
+
+    def test_request_status_filter(self):
+        self.add_conversations(20, status="accepted")
+        self.add_conversations(20, status="blocked")
+        results = self.list_conversations(request_status="accepted|pending")
+        self.assertEqual(len(results), 20)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+@mock.patch("apps.views.chat.deliver_message")
+class SendQueriesTests(TestCase):
+    """
+        A send costs the same number of queries whatever the room size:
+        serializer validation, the snapshot (conversation lock, members,
+        settings, and the pair request of private rooms), the insert with its
+        sequence, inbox and change log updates, the response serializer, and
+        two savepoints. The first message of a room also bumps its message limit.
+    """
+    GROUP_SEND_QUERIES = 17
+    PRIVATE_SEND_QUERIES = GROUP_SEND_QUERIES + 1
+
+    def setUp(self):
+        self.profile = make_profile("owner")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.profile)
+
+    def send(self, conversation: Conversation, queries: int):
+        with self.assertNumQueries(queries):
+            response = self.client.post(reverse("message-list"), {
+                "conversation": str(conversation.id), "content": "hello",
+            }, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_private_send(self, deliver_message):
+        peer = make_profile("peer")
+        Request.objects.create(sender=self.profile, receiver=peer, status="accepted")
+        conversation = make_conversation(self.profile, peer)
+        Conversation.objects.filter(pk=conversation.pk).update(approved=True)
+        self.send(conversation, self.PRIVATE_SEND_QUERIES)
+        self.send(conversation, self.PRIVATE_SEND_QUERIES - 1)
+
+    def test_group_send(self, deliver_message):
+        for members in (2, 30):
+            conversation = make_conversation(
+                self.profile, *[make_profile(f"member{members}-{index}") for index in range(members)],
+                room_type=Conversation.GROUP,
+            )
+            Conversation.objects.filter(pk=conversation.pk).update(approved=True)
+            self.send(conversation, self.GROUP_SEND_QUERIES)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.profile = make_profile("owner")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.profile)
+        for index in range(7):
+            make_conversation(self.profile, make_profile(f"peer{index}"))
+
+    def test_pages_cover_every_row_once(self):
+        expected = set(Conversation.objects.filter(profiles=self.profile).values_list("id", flat=True))
+        seen = []
+        url = reverse("conversation-list") + "?limit=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(len(seen), len(expected))
+        self.assertEqual({str(conversation_id) for conversation_id in expected}, {str(row) for row in seen})
+
+    def test_malformed_cursor_is_not_found(self):
+        for data in ({"d": "o", "p": 5}, {"d": "o", "p": "ab"}, {"d": "x", "p": [1, 2]}, [1, 2], "o",
+                     {"d": "o", "p": ["yesterday", "not-an-id"]}):
+            token = base64.urlsafe_b64encode(json.dumps(data).encode("utf-8")).decode("ascii")
+            response = self.client.get(reverse("conversation-list"), {"cursor": token})
+            self.assertEqual(response.status_code, 404, data)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+@mock.patch("apps.views.chat.send_reaction")
+class ReactionTests(TransactionTestCase):
+    """Runs outside a test transaction so deferred foreign keys are checked on commit."""
+
+    def setUp(self):
+        self.profile = make_profile("owner")
+        self.peer = make_profile("peer")
+        conversation = make_conversation(self.profile, self.peer)
+        self.message = Message.objects.bulk_create([
+            Message(conversation=conversation, sender=self.peer, content="hi"),
+        ])[0]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.profile)
+        reaction_cache.clear()
+
+    def react(self, text: str):
+        return self.client.post(reverse("message-react-list"), {"message": str(self.message.id), "reaction": text})
+
+    def test_recreated_reaction_row_is_reloaded(self, send_reaction):
+        self.assertEqual(self.react("+1").status_code, 201)
+        self.client.delete(reverse("message-react-detail", args=[MessageReact.objects.get().id]))
+        Reaction.objects.filter(reaction="+1").delete()
+        Reaction.objects.create(reaction="+1")
+
+        self.assertEqual(self.react("+1").status_code, 201)
+        self.assertEqual(MessageReact.objects.get(is_active=True).reaction, Reaction.objects.get(reaction="+1"))
+
+    def test_update_is_not_allowed(self, send_reaction):
+        self.react("+1")
+        self.react("heart")
+        react = MessageReact.objects.get(reaction__reaction="+1")
+        url = reverse("message-react-detail", args=[react.id])
+        self.assertEqual(self.client.patch(url, {"reaction": Reaction.objects.get(reaction="heart").id}).status_code, 405)
+        self.assertEqual(self.client.put(url, {}).status_code, 405)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class SyncTests(TransactionTestCase):
+    """Outside a test transaction: on Postgres the feed only serves rows of finished transactions."""
+
+    def setUp(self):
+        self.profile = make_profile("owner")
+        self.peer = make_profile("peer")
+        self.conversation = make_conversation(self.profile, self.peer)
+        self.client = APIClient()
+
+    def sync(self, profile: Profile, since: int = 0):
+        self.client.force_authenticate(user=profile)
+        response = self.client.get(reverse("sync"), {"since": since})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_settings_only_synced_to_their_profile(self):
+        settings = ConversationSettings.objects.get(profile=self.peer, conversation=self.conversation)
+        settings.is_blocked = True
+        settings.save()
+
+        self.assertNotIn(str(settings.id), [item["id"] for item in self.sync(self.profile)["settings"]])
+        self.assertIn(str(settings.id), [item["id"] for item in self.sync(self.peer)["settings"]])
+
+    @mock.patch("apps.views.chat.ProfileRepo")
+    @mock.patch("apps.utils.permissions.authentication.resolve_profile")
+    def test_request_accepted_through_the_api_is_synced(self, resolve_profile, profile_repo):
+        request = Request.objects.create(sender=self.profile, receiver=self.peer, status="pending")
+        since = self.sync(self.profile)["seq"]
+
+        resolve_profile.return_value = self.peer
+        profile_repo.return_value.profiles_by_ids.return_value = [self.profile]
+        response = APIClient().post(
+            reverse("request-to-user"), {"user_id": 1, "status": "accepted"}, HTTP_AUTHORIZATION="Bearer token",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+        data = self.sync(self.profile, since)
+        self.assertEqual([(item["id"], item["status"]) for item in data["requests"]], [(str(request.id), "accepted")])
+
+    @skipUnless(connection.vendor == "postgresql", "transaction ordering is Postgres only")
+    def test_late_commit_is_not_skipped(self):
+        since = self.sync(self.profile)["seq"]
+        slow = connection.copy()
+        try:
+            slow.set_autocommit(False)
+            with slow.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO apps_changelog (kind, object_id, conversation_id, created_at, txid) "
+                    "VALUES (%s, %s, %s, now(), pg_current_xact_id()::text::bigint)",
+                    [ChangeLog.READ, uuid.uuid4(), self.conversation.id],
+                )
+            ChangeLog.record(ChangeLog.READ, self.peer.id, conversation_id=self.conversation.id)
+
+            # The fast transaction committed, but the slow one below it is still open.
+            self.assertEqual(self.sync(self.profile, since)["seq"], since)
+            slow.commit()
+        finally:
+            slow.close()
+
+        data = self.sync(self.profile, since)
+        self.assertGreater(data["seq"], since)
+        served = ChangeLog.objects.filter(conversation_id=self.conversation.id, txid__gt=since, txid__lte=data["seq"])
+        self.assertEqual(served.count(), 2)
+
+
+class ThreadTests(TestCase):
+
+    def setUp(self):
+        self.profile = make_profile("owner")
+        conversation = make_conversation(self.profile, make_profile("peer"))
+        self.root, self.other = Message.objects.bulk_create([
+            Message(conversation=conversation, sender=self.profile, content=content) for content in ("root", "other")
+        ])
+        self.replies = Message.objects.bulk_create([
+            Message(conversation=conversation, sender=self.profile, content=f"reply{index}", parent=self.root)
+            for index in range(30)
+        ])
+        self.nested = Message.objects.bulk_create([
+            Message(conversation=conversation, sender=self.profile, content="nested", parent=self.replies[0]),
+        ])[0]
+
+    def test_levels_only_read_the_allowed_rows(self):
+        with self.assertNumQueries(1):
+            thread = self.root.thread(max_depth=5, max_size=4)
+        self.assertEqual([message.depth for message in thread], [0, 1, 1, 1])
+
+        # Root replies, the nested reply, then an empty third level.
+        with self.assertNumQueries(3):
+            thread = self.root.thread(max_depth=5, max_size=50)
+        self.assertEqual(len(thread), 32)
+        self.assertEqual((thread[-1].pk, thread[-1].depth), (self.nested.pk, 2))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.root.thread(max_depth=1, max_size=50)), 31)
+
+    def test_moving_a_reply_recounts_both_parents(self):
+        Message.recount_replies(self.root.pk)
+        reply = self.replies[1]
+        reply.parent = self.other
+        reply.save(validate=False)
+
+        self.root.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.root.reply_count, self.other.reply_count), (29, 1))
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+@mock.patch("apps.views.chat.deliver_message")
+class ForwardTests(TestCase):
+
+    def setUp(self):
+        self.profile = make_profile("owner")
+        self.listener = make_profile("listener")
+        self.muted = make_profile("muted")
+        source = make_conversation(self.profile, self.listener)
+        self.sources = Message.objects.bulk_create([
+            Message(conversation=source, sender=self.listener, content=f"source{index}") for index in range(3)
+        ])
+        self.target = make_conversation(self.profile, self.listener, self.muted, room_type=Conversation.GROUP)
+        Conversation.objects.filter(pk=self.target.pk).update(approved=True)
+        settings = ConversationSettings.objects.get(profile=self.muted, conversation=self.target)
+        settings.is_muted = True
+        settings.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.profile)
+
+    def test_copies_are_fanned_out_like_a_send(self, deliver_message):
+        response = self.client.post(reverse("message-forward-list"), {
+            "messages": [str(message.id) for message in self.sources],
+            "conversations": [str(self.target.id)],
+        }, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+
+        copies = list(self.target.messages.order_by("created_at", "id"))
+        self.assertEqual([message.content for message in copies], ["source0", "source1", "source2"])
+        self.assertEqual([call.args[0].id for call in deliver_message.call_args_list], [m.id for m in copies])
+        for call in deliver_message.call_args_list:
+            message, data, recipient_ids, listener_ids = call.args
+            self.assertEqual(data["id"], str(message.id))
+            self.assertEqual(set(recipient_ids), {self.listener.id, self.muted.id})
+            self.assertEqual(listener_ids, [self.listener.id])
+            self.assertEqual(message.unread_seq, Conversation.objects.get(pk=self.target.pk).message_seq)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+@skipUnless(connection.vendor == "postgresql", "ts_rank is Postgres only")
+class MessageSearchPaginationTests(TestCase):
+
+    def setUp(self):
+        self.profile = make_profile("owner")
+        conversation = make_conversation(self.profile, make_profile("peer"))
+        # Repeated texts rank the same, so most pages end inside a tie.
+        contents = ["deploy the release"] * 7 + ["deploy the release tonight, the release is ready"] * 5 + [
+            f"deploy hotfix {index} of the release train" for index in range(6)
+        ]
+        self.messages = Message.objects.bulk_create([
+            Message(conversation=conversation, sender=self.profile, content=content) for content in contents
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.profile)
+
+    def test_pages_cover_every_hit_once(self):
+        seen = []
+        url = reverse("message-search") + "?q=release&limit=4"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(sorted(seen), sorted(str(message.id) for message in self.messages))
+
+
+class SocketPresenceTests(TestCase):
+
+    def test_status_update_keeps_newer_profile_fields(self):
+        profile = make_profile("owner")
+        consumer = SocketConsumer()
+        consumer.user = copy.copy(profile)
+        Profile.objects.filter(pk=profile.pk).update(first_name="renamed", is_private=True)
+
+        async_to_sync(consumer.update_status)(True)
+
+        profile.refresh_from_db()
+        self.assertEqual((profile.first_name, profile.is_private, profile.is_online), ("renamed", True, True))
+
+
+@override_settings(SOCKET_BATCH_WINDOW_MS=5, SOCKET_BATCH_MAX_EVENTS=50)
+class SocketBatchingTests(SimpleTestCase):
+
+    def make_consumer(self, **send) -> SocketConsumer:
+        consumer = SocketConsumer()
+        consumer.channel_name = "test.channel"
+        consumer.channel_layer = mock.AsyncMock()
+        consumer.base_send = mock.AsyncMock(**send)
+        consumer.batching = True
+        consumer.outbox = []
+        return consumer
+
+    def test_failed_timed_flush_is_logged(self):
+        consumer = self.make_consumer(side_effect=RuntimeError("socket gone"))
+
+        async def emit_and_wait():
+            await consumer.emit("parser", {"data": 1})
+            await asyncio.sleep(0.05)
+
+        with self.assertLogs("apps", "ERROR") as logs:
+            asyncio.run(emit_and_wait())
+        self.assertIn("socket gone", "\n".join(logs.output))
+        self.assertIsNone(consumer.flush_task)
+
+    def test_close_sends_batched_events_first(self):
+        consumer = self.make_consumer()
+
+        async def emit_and_close():
+            await consumer.emit("parser", {"data": 1})
+            await consumer.emit("parser", {"data": 2})
+            await consumer.close()
+
+        asyncio.run(emit_and_close())
+        self.assertEqual([call.args[0] for call in consumer.base_send.call_args_list], [
+            {"type": "websocket.send", "text": json.dumps([{"data": 1}, {"data": 2}])},
+            {"type": "websocket.close"},
+        ])
+
+    def test_disconnect_drops_batched_events_on_purpose(self):
+        consumer = self.make_consumer()
+
+        async def emit_and_disconnect():
+            await consumer.emit("parser", {"data": 1})
+            await consumer.disconnect(1000)
+            await asyncio.sleep(0.02)
+
+        with self.assertLogs("apps", "INFO") as logs:
+            asyncio.run(emit_and_disconnect())
+        self.assertIn("1 batched events unsent", "\n".join(logs.output))
+        self.assertEqual(consumer.outbox, [])
+        consumer.base_send.assert_not_called()
+
+
+class ProfileSyncTests(TestCase):
+    """Profiles from the user service are upserted with the same queries whatever the batch size."""
+
+    def setUp(self):
+        self.repo = ProfileRepo(token="token")
+        self.repo.service = mock.Mock()
+
+    @staticmethod
+    def remote_profiles(count: int, start: int = 0, last_name: str = "synced"):
+        return [
+            {"id": index, "first_name": f"user{index}", "last_name": last_name, "email": f"user{index}@example.com",
+             "username": f"user{index}", "is_private": False}
+            for index in range(start, start + count)
+        ]
+
+    def sync(self, remote, queries: int):
+        self.repo.service.get_profiles_by_ids.return_value = remote
+        with self.assertNumQueries(queries):
+            profiles = self.repo.profiles_by_ids(ids=[profile["id"] for profile in remote])
+        self.assertEqual([profile.email for profile in profiles], [profile["email"] for profile in remote])
+        return profiles
+
+    def test_query_count_is_flat(self):
+        # Load the existing rows, insert, reload the inserted ones for their keys.
+        self.sync(self.remote_profiles(5), queries=3)
+        self.sync(self.remote_profiles(50, start=5), queries=3)
+        # Load, then write the changed rows in place.
+        self.sync(self.remote_profiles(5, last_name="renamed"), queries=2)
+        self.sync(self.remote_profiles(50, start=5, last_name="renamed"), queries=2)
+
+    def test_unchanged_profiles_are_not_written(self):
+        self.sync(self.remote_profiles(50), queries=3)
+        updated_at = dict(Profile.objects.values_list("email", "updated_at"))
+        profiles = self.sync(self.remote_profiles(50), queries=1)
+        self.assertEqual(dict(Profile.objects.values_list("email", "updated_at")), updated_at)
+        self.assertEqual({profile.pk for profile in profiles}, set(Profile.objects.values_list("pk", flat=True)))
+
+    def test_profile_inserted_concurrently_keeps_its_key(self):
+        remote = self.remote_profiles(3)
+        apply_changes = ProfileRepo.apply_changes
+
+        def insert_first(by_email, existing):
+            # Another sync stores the same email between the load and the upsert.
+            Profile.objects.create(user_id="1", first_name="stale", email=remote[1]["email"])
+            return apply_changes(by_email, existing)
+
+        with mock.patch.object(ProfileRepo, "apply_changes", side_effect=insert_first):
+            profiles = self.sync(remote, queries=4)
+
+        stored = Profile.objects.get(email=remote[1]["email"])
+        self.assertEqual(profiles[1].pk, stored.pk)
+        self.assertEqual(stored.first_name, "user1")
+        self.assertEqual(Profile.objects.count(), 3)
+
+
+@skipUnless(connection.vendor == "postgresql", "plans are checked on Postgres")
+class HotQueryPlanTests(TestCase):
+    """Every query of `explain_hot_queries` must have an index to use, see that command."""
+
+    def test_hot_queries_use_indexes(self):
+        profile = make_profile("owner")
+        peer = make_profile("peer")
+        conversation = make_conversation(profile, peer)
+        Request.objects.create(sender=profile, receiver=peer, status="accepted")
+        Message.objects.bulk_create([
+            Message(conversation=conversation, sender=peer, content=f"message {index}") for index in range(5)
+        ])
+
+        for name, queryset in ExplainHotQueries.hot_queries(profile, conversation, peer):
+            with self.subTest(name):
+                plan = ExplainHotQueries.explain(queryset)
+                self.assertEqual(ExplainHotQueries.sequential_scans(plan), [], plan)
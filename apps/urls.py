@@ -10,7 +10,10 @@ from .views import (MessageViewset,
                     MessageReactViewset,
                     CustomRequestViewSet,
                     RequestViewset,
-                    HiddenRequestViewSet)
+                    HiddenRequestViewSet,
+                    UnreadCountViewSet,
+                    MessageSearchViewSet,
+                    SyncViewSet)
 
 router = DefaultRouter()
 router.register("message", MessageViewset, "message")
@@ -27,6 +30,9 @@ urlpatterns = [
     path('', include(router.urls)),
     path("conversation-user/<int:user_id>/", ConversationUserViewSet.as_view(), name="conversation-users"),
     path("requests-to-user/", CustomRequestViewSet.as_view(), name="request-to-user"),
+    path("unread-count/", UnreadCountViewSet.as_view(), name="unread-count"),
+    path("message-search/", MessageSearchViewSet.as_view(), name="message-search"),
+    path("sync/", SyncViewSet.as_view(), name="sync"),
     # path("message-forward/", ConversationUserViewSet.as_view(), name="conversation-users")
 
 ]
@@ -0,0 +1,172 @@
+import json
+import base64
+import datetime
+import uuid
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+        Keyset (cursor) pagination over a descending composite key.
+
+        Rows are ordered by `ordering` (default `-created_at, -id`, override
+        per view with `cursor_ordering`) and pages are selected with a
+        row-value comparison against the last/first row seen, so the cost of
+        a page doesn't depend on how deep it is and concurrent inserts never
+        shift or duplicate rows.
+
+        `next` walks towards older rows and is absent on the last page.
+        `previous` returns rows newer than the first one of the page and is
+        always present, so clients can poll it to catch up.
+    """
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    ordering: Sequence[str] = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    OLDER = "o"
+    NEWER = "n"
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> List[Any]:
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [field.lstrip("-") for field in getattr(view, "cursor_ordering", self.ordering)]
+        direction, position = self.decode_cursor(request)
+
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.keyset_filter(position, newer=direction == self.NEWER))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        if direction == self.NEWER:
+            queryset = queryset.order_by(*self.fields)
+        else:
+            queryset = queryset.order_by(*["-" + field for field in self.fields])
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if direction == self.NEWER:
+            rows.reverse()
+
+        self.page = rows
+        self.has_older = has_more if direction == self.OLDER else bool(rows)
+        self.anchor = position
+        return rows
+
+    def keyset_filter(self, position: List[Any], newer: bool) -> Q:
+        """
+            `(f1, f2, ...) < (v1, v2, ...)`, or `>` when `newer`, expanded for the ORM.
+
+            The expansion `f1 < v1 OR (f1 = v1 AND f2 < v2)` alone can't be used
+            as an index range bound, so it is ANDed with `f1 <= v1` (`>=`), which
+            the planner turns into the start of the index scan.
+        """
+        lookup = "gt" if newer else "lt"
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            term = Q(**{f"{field}__{lookup}": position[index]})
+            for previous, value in zip(self.fields[:index], position[:index]):
+                term &= Q(**{previous: value})
+            condition |= term
+        return Q(**{f"{self.fields[0]}__{lookup}e": position[0]}) & condition
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def position_of(self, obj: Any) -> List[Any]:
+        return [self.to_primitive(getattr(obj, field)) for field in self.fields]
+
+    @staticmethod
+    def to_primitive(value: Any) -> Any:
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        return value
+
+    def encode_cursor(self, direction: str, position: List[Any], url: Optional[str] = None) -> str:
+        raw = json.dumps({"d": direction, "p": position}, separators=(",", ":"))
+        token = base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+        url = url or self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request) -> Tuple[str, Optional[List[Any]]]:
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return self.OLDER, None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8"))
+            direction, position = data["d"], data["p"]
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if (direction not in (self.OLDER, self.NEWER)
+                or not isinstance(position, list)
+                or len(position) != len(self.fields)):
+            raise NotFound(self.invalid_cursor_message)
+        return direction, position
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_older:
+            return self.get_continuation_link()
+        return self.encode_cursor(self.OLDER, self.position_of(self.page[-1]))
+
+    def get_continuation_link(self) -> Optional[str]:
+        """
+            Next link into another source once this one is exhausted.
+
+            A view sets `continuation` (extra query params, e.g. `{"archive": "1"}`)
+            when older rows live elsewhere; the cursor position carries over.
+        """
+        continuation = getattr(self, "continuation", None)
+        if not continuation:
+            return None
+        url = self.request.build_absolute_uri()
+        for key, value in continuation.items():
+            url = replace_query_param(url, key, value)
+        if self.page:
+            position = self.position_of(self.page[-1])
+        elif self.anchor is not None:
+            position = self.anchor
+        else:
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.OLDER, position, url=url)
+
+    def get_previous_link(self) -> Optional[str]:
+        if self.page:
+            return self.encode_cursor(self.NEWER, self.position_of(self.page[0]))
+        if self.anchor is not None:
+            return self.encode_cursor(self.NEWER, self.anchor)
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data) -> Response:
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,143 @@
+import copy
+import hashlib
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import ExpiredTokenError, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.models import Profile
+from apps.repositories import ProfileRepo
+from apps.utils.cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+profile_cache = TTLCache(
+    maxsize=settings.PROFILE_CACHE_MAXSIZE,
+    ttl=settings.PROFILE_LOCAL_CACHE_TTL,
+)
+
+
+def strip_token(token: str) -> str:
+    """Removes the `Bearer` prefix from an Authorization header value."""
+    token = token.strip()
+    return token.split(" ")[-1] if "Bearer" in token else token
+
+
+def token_key(token: str) -> str:
+    return "auth:profile:" + hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def token_ttl(token: str) -> int:
+    """
+        Checks the token locally and returns for how many seconds its profile may be cached.
+
+        The signature is verified with the SIMPLE_JWT settings. When it can't be
+        verified (e.g. the user service rotated its signing key) the claims are
+        read unverified only to bound the TTL; such a token is trusted solely
+        after the user service has accepted it.
+
+        Raises:
+            AuthenticationFailed: The token is expired or malformed.
+    """
+    try:
+        payload = AccessToken(token).payload
+    except ExpiredTokenError:
+        raise AuthenticationFailed("Token is expired.")
+    except TokenError:
+        try:
+            payload = AccessToken(token, verify=False).payload
+        except TokenError:
+            raise AuthenticationFailed("Token is invalid.")
+        log.debug("Token signature couldn't be verified locally, deferring to user service")
+
+    remaining = int(payload.get("exp", 0) - timezone.now().timestamp())
+    if remaining <= 0:
+        raise AuthenticationFailed("Token is expired.")
+    return min(remaining, settings.PROFILE_CACHE_TTL)
+
+
+def shared_profile(key: str) -> Optional[Profile]:
+    try:
+        profile_id = cache.get(key)
+    except Exception as e:
+        log.warning(f"Profile cache unavailable: {e}")
+        return None
+    if not profile_id:
+        return None
+    return Profile.objects.filter(id=profile_id).first()
+
+
+def share_profile(key: str, profile: Profile, ttl: int) -> None:
+    try:
+        cache.set(key, str(profile.id), timeout=ttl)
+    except Exception as e:
+        log.warning(f"Profile cache unavailable: {e}")
+
+
+def resolve_profile(token: str) -> Profile:
+    """
+        Returns the Profile for an access token, calling the user service only on a cache miss.
+
+        Lookups go through the in-process LRU first, then the shared Redis
+        cache keyed by the token hash, and finally the user service.
+
+        Args:
+            token (str): Raw token or `Bearer <token>` header value.
+        Returns:
+            Profile: The authenticated profile.
+    """
+    token = strip_token(token)
+    ttl = token_ttl(token)
+    key = token_key(token)
+
+    profile = profile_cache.get(key)
+    if profile is not None:
+        return copy.copy(profile)
+
+    profile = shared_profile(key)
+    if profile is None:
+        profile = ProfileRepo(token=token).verify_user_by_token()
+        share_profile(key, profile, ttl)
+    profile_cache.set(key, profile, ttl=min(ttl, settings.PROFILE_LOCAL_CACHE_TTL))
+    return copy.copy(profile)
+
+
+async def ashared_profile(key: str) -> Optional[Profile]:
+    try:
+        profile_id = await cache.aget(key)
+    except Exception as e:
+        log.warning(f"Profile cache unavailable: {e}")
+        return None
+    if not profile_id:
+        return None
+    return await Profile.objects.filter(id=profile_id).afirst()
+
+
+async def ashare_profile(key: str, profile: Profile, ttl: int) -> None:
+    try:
+        await cache.aset(key, str(profile.id), timeout=ttl)
+    except Exception as e:
+        log.warning(f"Profile cache unavailable: {e}")
+
+
+async def aresolve_profile(token: str) -> Profile:
+    """Async variant of `resolve_profile`; the user service is called with the asyncio client."""
+    token = strip_token(token)
+    ttl = token_ttl(token)
+    key = token_key(token)
+
+    profile = profile_cache.get(key)
+    if profile is not None:
+        return copy.copy(profile)
+
+    profile = await ashared_profile(key)
+    if profile is None:
+        profile = await ProfileRepo(token=token).averify_user_by_token()
+        await ashare_profile(key, profile, ttl)
+    profile_cache.set(key, profile, ttl=min(ttl, settings.PROFILE_LOCAL_CACHE_TTL))
+    return copy.copy(profile)
@@ -1,16 +1,34 @@
-from apps.models import Follower
-from django.db.models import Q
+from typing import Any
+from apps.models import Follower, Request
+from django.db.models import Case, F, Q, QuerySet, When
 
-def check_mutual(profile1, profile2):
-    try:
-        user_follow_ids = Follower.objects.filter(follower=profile1).values_list("following_id", flat=True)
-        user_follower_ids = Follower.objects.filter(following=profile1).values_list("follower_id", flat=True)
 
-        profile_follow_ids = Follower.objects.filter(follower=profile2).values_list("following_id", flat=True)
-        profile_follower_ids = Follower.objects.filter(following=profile2).values_list("follower_id", flat=True)
-        all_user_related_ids = set(user_follow_ids) | set(user_follower_ids)
-        all_profile_related_ids = set(profile_follow_ids) | set(profile_follower_ids)
+def friend_ids(profile_id: Any) -> QuerySet:
+    """Ids of the profiles `profile_id` has an accepted request with, as a subquery."""
+    return Request.objects.filter(
+        Q(sender_id=profile_id) | Q(receiver_id=profile_id),
+        status="accepted",
+    ).annotate(
+        friend_id=Case(When(sender_id=profile_id, then=F("receiver_id")), default=F("sender_id")),
+    ).values("friend_id")
+
+
+def related_ids(profile_id: Any) -> QuerySet:
+    """Ids of the profiles following or followed by `profile_id`, as a subquery."""
+    return Follower.objects.filter(
+        Q(follower_id=profile_id) | Q(following_id=profile_id),
+    ).annotate(
+        related_id=Case(When(follower_id=profile_id, then=F("following_id")), default=F("follower_id")),
+    ).values("related_id")
+
 
-        return bool(all_user_related_ids & all_profile_related_ids)
+def have_mutual_friend(profile_id: Any, other_id: Any) -> bool:
+    """Whether both profiles have an accepted request with a common profile, intersected in SQL."""
+    return friend_ids(profile_id).filter(friend_id__in=friend_ids(other_id)).exists()
+
+
+def check_mutual(profile1, profile2):
+    try:
+        return related_ids(profile1.id).filter(related_id__in=related_ids(profile2.id)).exists()
     except Exception as e:
-        print("the error, ", str(e))
\ No newline at end of file
+        print("the error, ", str(e))
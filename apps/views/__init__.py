@@ -8,5 +8,8 @@ from .chat import (MessageViewset,
                    AttachmentViewSet,
                    MessageReactViewset,
                    CustomRequestViewSet,
-                   HiddenRequestViewSet
+                   HiddenRequestViewSet,
+                   UnreadCountViewSet,
+                   MessageSearchViewSet,
+                   SyncViewSet
                    )
\ No newline at end of file
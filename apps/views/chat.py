@@ -1,15 +1,24 @@
 import logging
 from django.conf import settings
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import Q, Count, prefetch_related_objects
 
 from rest_framework.response import Response
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets, permissions, status, filters, generics
-from apps.repositories.conversation.message_service import validate_and_create_message
-from apps.repositories import ProfileRepo, InteractionService
-from apps.celery_tasks import send_messages
+from apps.repositories.conversation.message_service import (cached_send, forward_messages, remember_send,
+                                                            send_message)
+from apps.repositories import (ProfileRepo, InteractionService, ConversationRepo, UnreadCounter, MessageSearch,
+                               ReactionRepo, ChangeFeed, SyncExpired)
+from apps.repositories.unread import TOTAL_FIELD
+from apps.celery_tasks import deliver_message, send_reaction
 from apps.utils import CustomAuthenticated
+from apps.utils.pagination import KeysetPagination
 from apps.utils.utils import check_mutual
 from apps.models import (Conversation,
                         Follower,
@@ -19,9 +28,15 @@ from apps.models import (Conversation,
                         Request,
                         MessageReact,
                         Reaction,
-                        Attachments)
+                        Attachments,
+                        InboxEntry,
+                        MessageArchive,
+                        make_pair_key)
 from apps.serializers import (MessageSerializer,
+                            MessageThreadSerializer,
                             MessageInfoSerializer,
+                            MessageArchiveSerializer,
+                            MessageSearchSerializer,
                             ConversationSerializer,
                             ConversationInfoSerializer,
                             ConversationSettingsSerializer,
@@ -34,18 +49,18 @@ from apps.serializers import (MessageSerializer,
                             MessageReactSerializer,
                             MessageReactInfoSerializer,
                             AttachmentSerializer,
-                            RequestInfoSerializer)
+                            RequestInfoSerializer,
+                            ConversationPageLoader,
+                            ReadWatermarks)
 
 from apps.filters import ConversationFilter
 log = logging.getLogger(__file__)
-import requests
-
-base_url = settings.BASE_URL
 
 class MessageViewset(viewsets.ModelViewSet):
     permission_classes = [CustomAuthenticated]
     http_method_names = ['get', 'put', 'delete', 'patch', "post"]
     queryset = Message.objects.filter(is_active=True).order_by("-created_at")
+    pagination_class = KeysetPagination
     search_fields = ['id', "conversation__id"]
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     filterset_fields = {
@@ -57,82 +72,114 @@ class MessageViewset(viewsets.ModelViewSet):
         return Message.objects.filter(
             is_active=True,
             conversation__profiles__in = [user]
-        ).order_by("-created_at")
+        ).order_by("-created_at", "-id")
 
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
             return MessageInfoSerializer
         return MessageSerializer
+
+    def get_archive_queryset(self):
+        return MessageArchive.objects.filter(
+            is_active=True,
+            conversation__profiles=self.request.user,
+        ).order_by("-created_at", "-id")
+
+    def list(self, request, *args, **kwargs):
+        """
+            Pages through the hot Message table, then through MessageArchive.
+
+            The last hot page links to `?archive=1` with the same cursor when
+            older messages have been archived.
+        """
+        archive = request.query_params.get("archive") == "1"
+        if archive:
+            queryset = self.filter_queryset(self.get_archive_queryset())
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        messages = page if page is not None else list(queryset)
+        if page is not None and not archive and not self.paginator.has_older:
+            if self.filter_queryset(self.get_archive_queryset()).exists():
+                self.paginator.continuation = {"archive": "1"}
+
+        context = self.get_serializer_context()
+        context["read_watermarks"] = ReadWatermarks().load({message.conversation_id for message in messages})
+        serializer_class = MessageArchiveSerializer if archive else self.get_serializer_class()
+        serializer = serializer_class(messages, many=True, context=context)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
     
     def create(self, request, *args, **kwargs):
+        """
+            Sends a message. A retry with the same `client_message_id` gets the
+            stored message back with 200 and isn't delivered again.
+        """
+        client_message_id = request.data.get("client_message_id")
+        cached = cached_send(request.user.id, client_message_id)
+        if cached is not None:
+            return Response(cached, status=status.HTTP_200_OK)
+
         data = request.data.copy()
         data["sender"] = str(request.user.id)
-        sender = request.user.id
         serializer = self.get_serializer(data=data)
-        conversation_id = data.get("conversation")
+        serializer.is_valid(raise_exception=True)
         try:
-            conversation = Conversation.objects.prefetch_related("profiles").get(id=conversation_id)
-        except Conversation.DoesNotExist:
+            snapshot = send_message(serializer.validated_data, request.user)
+        except Http404:
             return Response({"detail": "Invalid conversation ID."}, status=status.HTTP_400_BAD_REQUEST)
-        conversation_user_ids = list(conversation.profiles.values_list("id", flat=True))
-        if conversation.room_type == Conversation.PRIVATE and len(conversation_user_ids) == 2:
-            if sender in conversation_user_ids:
-                other_user = next(uid for uid in conversation_user_ids if uid != sender)
-                # Check direct request
-                existing_request = Request.objects.filter(
-                    Q(sender=sender, receiver=other_user) |
-                    Q(sender=other_user, receiver=sender)
-                ).first()
-
-                if not existing_request:
-                    # Get sender friends
-                    sender_friends = Request.objects.filter(
-                        Q(sender=sender, status="accepted") | Q(receiver=sender, status="accepted")
-                    ).values_list("sender_id", "receiver_id")
-
-                    sender_friend_ids = set()
-                    for s, r in sender_friends:
-                        sender_friend_ids.update([s, r])
-                    sender_friend_ids.discard(sender)
-
-                    # Get receiver friends
-                    receiver_friends = Request.objects.filter(
-                        Q(sender=other_user, status="accepted") | Q(receiver=other_user, status="accepted")
-                    ).values_list("sender_id", "receiver_id")
-
-                    receiver_friend_ids = set()
-                    for s, r in receiver_friends:
-                        receiver_friend_ids.update([s, r])
-                    receiver_friend_ids.discard(other_user)
-
-                    mutual_ids = sender_friend_ids & receiver_friend_ids
-                    if mutual_ids:
-                        # Create hidden request
-                        sender_profile = Profile.objects.get(id=sender)
-                        receiver_profile = Profile.objects.get(id=other_user)
-                        hidden_request, created = Request.objects.get_or_create(
-                            sender=sender_profile,
-                            receiver=receiver_profile,
-                            defaults={"status": "hidden"}
-                        )
-                        if not created and hidden_request.status != "hidden":
-                            hidden_request.status = "hidden"
-                            hidden_request.save()
+        except APIException as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
 
-        if serializer.is_valid(raise_exception=True):
-            try:
-                conversation, receiver = validate_and_create_message(data, request.user)
-                message = serializer.save()
-                send_messages.delay(message_id=message.id, user_id=message.receiver().id)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
+        message = serializer.instance = snapshot.message
+        remember_send(request.user.id, client_message_id, serializer.data)
+        if snapshot.replayed:
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        deliver_message(
+            message,
+            serializer.data,
+            [recipient.id for recipient in snapshot.recipients],
+            [listener.id for listener in snapshot.listeners],
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["get"])
+    def thread(self, request, *args, **kwargs):
+        """
+            `GET message/<id>/thread/[?depth=<levels>&limit=<messages>]`
+
+            The active reply subtree of the message, breadth first, one query
+            per level. `truncated` is set when `limit` cut it short; replies
+            below `depth` levels are never included.
+        """
+        root = self.get_object()
+        try:
+            depth = int(request.query_params.get("depth", settings.THREAD_MAX_DEPTH))
+            limit = int(request.query_params.get("limit", settings.THREAD_MAX_SIZE))
+        except ValueError:
+            return Response({"error": "depth and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        depth = max(0, min(depth, settings.THREAD_MAX_DEPTH))
+        limit = max(1, min(limit, settings.THREAD_MAX_SIZE))
+
+        messages = root.thread(max_depth=depth, max_size=limit + 1)
+        truncated = len(messages) > limit
+        messages = messages[:limit]
+        prefetch_related_objects(messages, "file")
+        context = self.get_serializer_context()
+        context["read_watermarks"] = ReadWatermarks().load([root.conversation_id])
+        return Response({
+            "root": str(root.id),
+            "truncated": truncated,
+            "messages": MessageThreadSerializer(messages, many=True, context=context).data,
+        })
 
-        return Response("Message couldn't be sent please try again", status=status.HTTP_400_BAD_REQUEST)
-        
 class MessageReactViewset(viewsets.ModelViewSet):
     permission_classes = [CustomAuthenticated]
-    http_method_names = ['get', 'put', 'delete', 'patch', "post"]
+    # No PUT/PATCH: changing a reaction is a remove and an add, see ReactionRepo
+    http_method_names = ['get', 'delete', "post"]
     queryset = MessageReact.objects.filter(is_active=True).order_by("-created_at")
     # search_fields = ['id', "conversation__id"]
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
@@ -153,17 +200,68 @@ class MessageReactViewset(viewsets.ModelViewSet):
             return MessageReactInfoSerializer
         return MessageReactSerializer
 
+    def get_reaction_input(self, request):
+        """
+            Returns:
+                Tuple[Message, str]: The reacted message and the reaction text.
+            Raises:
+                ValidationError: `reaction` or `message` is missing or unknown.
+        """
+        text = request.data.get("reaction")
+        if not text:
+            raise ValidationError("Reaction is required")
+        try:
+            return ReactionRepo(request.user).get_message(request.data.get("message")), text
+        except (Message.DoesNotExist, DjangoValidationError, ValueError):
+            raise ValidationError("Message not found.")
+
     def create(self, request, *args, **kwargs):
+        """Adds the reaction unless the user already has it: 201 when added, 200 with the existing one."""
         try:
-            data = request.data.copy()
-            if not "reaction" in data:
-                return Response("Reaction is required", status=status.HTTP_400_BAD_REQUEST)
-            reaction, _ = Reaction.objects.get_or_create(reaction=data["reaction"])
-            message = Message.objects.get(id=data["message"])
-            react = MessageReact.objects.create(message=message, reaction=reaction, reacted_by=request.user)
-            return Response(MessageReactSerializer(react).data, status=status.HTTP_201_CREATED)
+            message, text = self.get_reaction_input(request)
+            repo = ReactionRepo(request.user)
+            react, created = repo.add(message, text)
+        except APIException as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
+        if created:
+            send_reaction.delay(repo.event(react, message, ReactionRepo.ADDED))
+        return Response(
+            MessageReactSerializer(react).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if instance.reacted_by_id != request.user.id:
+            return Response("You can only remove your own reactions.", status=status.HTTP_403_FORBIDDEN)
+        repo = ReactionRepo(request.user)
+        message = instance.message
+        react = repo.remove(message, instance.reaction.reaction)
+        if react is not None:
+            send_reaction.delay(repo.event(react, message, ReactionRepo.REMOVED))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=["post"])
+    def toggle(self, request, *args, **kwargs):
+        """Adds the reaction, or removes it when the user already has it."""
+        try:
+            message, text = self.get_reaction_input(request)
+            repo = ReactionRepo(request.user)
+            react, change = repo.toggle(message, text)
+        except APIException as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
+        event = repo.event(react, message, change)
+        send_reaction.delay(event)
+        return Response({
+            "action": change,
+            "reaction": MessageReactSerializer(react).data if change == ReactionRepo.ADDED else None,
+            "reaction_summary": event["reaction_summary"],
+        }, status=status.HTTP_200_OK)
+
 class MessageForwardViewSet(viewsets.ModelViewSet):
 
     permission_classes = [CustomAuthenticated]
@@ -186,23 +284,26 @@ class MessageForwardViewSet(viewsets.ModelViewSet):
         if not message_ids:
             return Response("Message not found", status=status.HTTP_404_NOT_FOUND)
         
-        errors = []
-        for conversation in Conversation.objects.filter(id__in = conversations):
-            for message in Message.objects.filter(id__in = message_ids):
-                try:
-                    new_message = Message.objects.create(
-                        **message.get_content(),
-                        sender=request.user,
-                        conversation=conversation, 
-                        forwarded_from=message,
-                        is_forwarded=True
-                    )
-                    send_messages.delay(message_id=new_message.id, user_id=new_message.receiver().id)
-                except Exception as e:
-                    errors.append(str(e) + f" {conversation.id}")
+        try:
+            result = forward_messages(message_ids, conversations, request.user)
+        except Exception as e:
+            log.error(str(e))
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not result.messages and not result.errors:
+            return Response("Message not found", status=status.HTTP_404_NOT_FOUND)
+
+        # Copies go through the same fan-out as a send, so muted or blocked
+        # members only get their unread counts bumped.
+        for conversation_id, messages in result.messages.items():
+            snapshot = result.snapshots[conversation_id]
+            recipient_ids = [recipient.id for recipient in snapshot.recipients]
+            listener_ids = [listener.id for listener in snapshot.listeners]
+            serialized = MessageSerializer(messages, many=True).data
+            for message, data in zip(messages, serialized):
+                deliver_message(message, data, recipient_ids, listener_ids)
 
         return Response({"success":"Message Forwarded Succesfully",
-                         "errors": errors}, status=status.HTTP_201_CREATED)
+                         "errors": result.errors}, status=status.HTTP_201_CREATED)
 
 class ConversationViewset(viewsets.ModelViewSet):
     permission_classes = [CustomAuthenticated]
@@ -228,69 +329,46 @@ class ConversationViewset(viewsets.ModelViewSet):
     #     'room_type': ['exact'],
     # }
     filterset_class = ConversationFilter
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-last_activity_at", "-id")
 
     def get_queryset(self):
         user = self.request.user
         request_status = self.request.query_params.get("request_status", None)
         statuses = request_status.split('|') if request_status else []
-
-        conversations = Conversation.objects.filter(
-            is_active=True,
-            profiles__in=[user]
-        ).order_by("-created_at")
-
-        convo_ids = []
-
-        for convo in conversations:
-            other_profile = convo.profiles.exclude(id=user.id).first()
-            if not other_profile:
-                continue
-
-            request_qs = Request.objects.filter(
-                Q(status__in=statuses) & (
-                    Q(sender=user, receiver=other_profile) |
-                    Q(sender=other_profile, receiver=user)
-                )
-            ).order_by('-created_at')
-
-            latest_request = request_qs.first()
-
-            if latest_request:
-                if not statuses or latest_request.status in statuses:
-                    convo_ids.append(convo.id)
-            elif not statuses:
-                # No request exists, but no filter was applied — include it
-                convo_ids.append(convo.id)
-
-        return Conversation.objects.filter(id__in=convo_ids).order_by("-created_at")
-
+        return ConversationRepo().for_profile(user, statuses=statuses)
 
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
             return ConversationInfoSerializer
         return ConversationSerializer
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        conversations = page if page is not None else list(queryset)
+
+        context = self.get_serializer_context()
+        context["page_loader"] = ConversationPageLoader(request.user).load(conversations)
+        serializer = self.get_serializer(conversations, many=True, context=context)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def perform_update(self, serializer):
+        conversation = serializer.save()
+        InboxEntry.ensure_entries(conversation)
     
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
         user = request.user
         repo = ProfileRepo(request.token)
+        int_service = InteractionService(request.token)
         items = [str(request.user.id)]
-        headers = {
-    'Authorization': 'Bearer {}'.format(request.token),
-    'Content-Type': 'application/json'
-        }
-
-        response = requests.get(
-            url = f'{base_url}/api/interaction/follow-list/?type=following',
-            headers=headers
-        )
-        followers_following_data = response.json()
+
+        followers_following_data = int_service.get_follow_list(type="following")
         if not followers_following_data['results']:
-            response = requests.get(
-            url= f'{base_url}/api/interaction/follow-list/?type=followers',
-            headers=headers
-        )
-            followers_following_data = response.json()   
+            followers_following_data = int_service.get_follow_list(type="followers")
         try:
             if data.get("profiles_user_ids", []):
                 op_profiles = repo.profiles_by_ids(ids=data.get("profiles_user_ids", ""))
@@ -301,15 +379,19 @@ class ConversationViewset(viewsets.ModelViewSet):
             log.error(str(e))
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if Conversation.objects.filter(profiles=user).filter(profiles=op_profiles[0]).exists():
+        private = data.get("room_type", Conversation.PRIVATE) == Conversation.PRIVATE
+        if private and Conversation.objects.filter(pair_key=make_pair_key(user.id, op_profiles[0].id)).exists():
             return Response({"error": "A private conversation between these two profiles already exists."}, status=status.HTTP_400_BAD_REQUEST)
         try:
             serializer = self.get_serializer(data=data)
             if serializer.is_valid(raise_exception=True):
-                conversation = serializer.save()
+                with transaction.atomic():
+                    conversation = serializer.save()
+                    if private and not conversation.assign_pair_key():
+                        transaction.set_rollback(True)
+                        return Response({"error": "A private conversation between these two profiles already exists."}, status=status.HTTP_400_BAD_REQUEST)
                 try:
                     for profile in op_profiles:
-                        int_service = InteractionService(request.token)
                         follow_status = int_service.get_follow_request_status([user.user_id, profile.user_id])
 
                         profile1 = user
@@ -358,11 +440,16 @@ class ConversationViewset(viewsets.ModelViewSet):
                         if (follows_1_to_2 == "accepted" or follows_2_to_1 == "accepted") and not profile1.is_private and not profile2.is_private:
                             req_status = "accepted"
 
-                        Request.objects.update_or_create(sender=user, receiver=profile, defaults={'status': req_status})
+                        Request.objects.update_or_create(
+                            pair_key=make_pair_key(user.id, profile.id),
+                            defaults={'status': req_status},
+                            create_defaults={'sender': user, 'receiver': profile, 'status': req_status},
+                        )
                 except Exception as e:
                     print("the error", str(e))
                 for profile in conversation.profiles.all():
                     conversation.settings.get_or_create(profile=profile)
+                InboxEntry.ensure_entries(conversation)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -385,16 +472,15 @@ class ConversationUserViewSet(generics.GenericAPIView):
 
         user2 = op_user[0]
 
-        conv = Conversation.objects.filter(profiles=user).filter(profiles=user2)
-        if conv.exists():
-            conversation = conv.first()
-        else:
-            conversation = Conversation.objects.create(
-                name=f"{user.first_name} - {user2.first_name}",
-                room_type=Conversation.PRIVATE,
-            )
-            conversation.profiles.add(user)
-            conversation.profiles.add(user2)
+        conversation, created = Conversation.objects.get_or_create(
+            pair_key=make_pair_key(user.id, user2.id),
+            defaults={
+                "name": f"{user.first_name} - {user2.first_name}",
+                "room_type": Conversation.PRIVATE,
+            },
+        )
+        if created:
+            conversation.profiles.add(user, user2)
             conversation.save()
         serializer = ConversationSerializer(conversation)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -455,10 +541,8 @@ class CustomRequestViewSet(generics.GenericAPIView):
             except Exception as e:
                 return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
             print("request4")
-            q1 = Request.objects.filter(sender=user).filter(receiver=user2)
-            q2 = Request.objects.filter(sender=user2).filter(receiver=user)
-            if q1.exists() or q2.exists():
-                req = q1 | q2
+            req = Request.objects.filter(pair_key=make_pair_key(user.id, user2.id))
+            if req.exists():
                 print("request3")
 
                 if "status" in data:
@@ -467,8 +551,10 @@ class CustomRequestViewSet(generics.GenericAPIView):
 
                     if existing_request.receiver != user and data["status"]=="accepted":
                         return Response({"error": "Sender can't accept the request"}, status=status.HTTP_400_BAD_REQUEST)
-                    req.update(status=data["status"])
-                    serializer = RequestInfoSerializer(req.first())  # Serialize single object
+                    # save() also syncs the inbox entries and logs the change for sync.
+                    existing_request.status = data["status"]
+                    existing_request.save(update_fields=["status", "updated_at"])
+                    serializer = RequestInfoSerializer(existing_request)  # Serialize single object
                     is_mutual = check_mutual(user, user2)
                     Follower.objects.create(follower=user, following=user2, is_mutual=is_mutual)
                     return Response(serializer.data, status=status.HTTP_200_OK)
@@ -578,12 +664,14 @@ class RequestViewset(viewsets.ModelViewSet):
                 data["receiver"] = str(repo.profiles_by_ids(ids=[data["receiver_user_id"]])[0].id)
 
             existing_request = Request.objects.filter(
-                sender_id=data["sender"],
-                receiver_id=data["receiver"],
-                status="deleted"
+                pair_key=make_pair_key(data["sender"], data["receiver"])
             ).first()
+            if existing_request and existing_request.status != "deleted":
+                return Response({"error": "A request between these profiles already exists."}, status=status.HTTP_400_BAD_REQUEST)
             if existing_request:
                 # Reactivate the deleted request
+                existing_request.sender_id = data["sender"]
+                existing_request.receiver_id = data["receiver"]
                 existing_request.status = "pending"
                 existing_request.is_active = True
                 existing_request.save()
@@ -608,14 +696,9 @@ class RequestViewset(viewsets.ModelViewSet):
         self.perform_update(serializer)
 
         if serializer.validated_data.get("status") == "accepted":
-            conversation = (
-                Conversation.objects.filter(
-                    room_type="private", profiles=instance.sender
-                )
-                .filter(profiles=instance.receiver)
-                .distinct()
-                .first()
-            )
+            conversation = Conversation.objects.filter(
+                pair_key=make_pair_key(instance.sender_id, instance.receiver_id)
+            ).first()
 
             if conversation:
                 conversation.approved = True
@@ -626,14 +709,9 @@ class RequestViewset(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         # Attempt to find and delete the associated private conversation
-        conversation = (
-            Conversation.objects.filter(
-                room_type="private", profiles=instance.sender
-            )
-            .filter(profiles=instance.receiver)
-            .distinct()
-            .first()
-        )
+        conversation = Conversation.objects.filter(
+            pair_key=make_pair_key(instance.sender_id, instance.receiver_id)
+        ).first()
 
         if conversation:
             conversation.delete()
@@ -677,3 +755,79 @@ class HiddenRequestViewSet(viewsets.ModelViewSet):
             {"detail": "Creation of hidden requests is not allowed via this endpoint."},
             status=status.HTTP_405_METHOD_NOT_ALLOWED
         )
+
+
+class UnreadCountViewSet(generics.GenericAPIView):
+    """Badge counts served from the Redis unread counters."""
+    permission_classes = [CustomAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        counter = UnreadCounter()
+        if request.query_params.get("conversations") in ("1", "true"):
+            counts = counter.counts(request.user.id)
+            total = counts.pop(TOTAL_FIELD, 0)
+            return Response({"total": max(total, 0), "conversations": counts})
+        return Response({"total": counter.total(request.user.id)})
+
+
+class MessageSearchViewSet(generics.GenericAPIView):
+    """
+        `GET message-search/?q=<text>[&conversation=<id>]`, ranked and highlighted.
+
+        Only conversations the caller is a member of are searched. Results are
+        keyset-paginated on (rank, id).
+    """
+    permission_classes = [CustomAuthenticated]
+    serializer_class = MessageSearchSerializer
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-rank", "-id")
+
+    def get(self, request, *args, **kwargs):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = MessageSearch(request.user).search(text, request.query_params.get("conversation"))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class SyncViewSet(generics.GenericAPIView):
+    """
+        `GET sync/?since=<seq>[&limit=<rows>]`, everything that changed after `seq`.
+
+        Returns the current state of changed messages (deleted ones as ids),
+        reaction summaries, read watermarks, settings and requests, plus the
+        `seq` to pass next time. Keep calling while `has_more` is true. A
+        `since` older than the retained change log gets 410 and the client
+        must reload from scratch (then sync from the `seq` of `since=0`).
+    """
+    permission_classes = [CustomAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            since = int(request.query_params.get("since", 0))
+            limit = int(request.query_params["limit"]) if "limit" in request.query_params else None
+        except ValueError:
+            return Response({"error": "since and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            changes = ChangeFeed(request.user).load(since, limit)
+        except SyncExpired as e:
+            return Response({"error": str(e)}, status=status.HTTP_410_GONE)
+
+        watermarks = ReadWatermarks().load({message.conversation_id for message in changes.messages})
+        return Response({
+            "seq": changes.seq,
+            "has_more": changes.has_more,
+            "messages": MessageSerializer(
+                changes.messages, many=True, context={"request": request, "read_watermarks": watermarks},
+            ).data,
+            "deleted_messages": changes.deleted_messages,
+            "reactions": changes.reactions,
+            "read": changes.read,
+            "settings": ConversationSettingsSerializer(changes.settings, many=True).data,
+            "requests": RequestSerializer(changes.requests, many=True).data,
+            "deleted_requests": changes.deleted_requests,
+        })
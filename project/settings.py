@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'drf_yasg',
     'rest_framework',
@@ -151,6 +152,19 @@ CHANNEL_LAYERS = {
     },
 }
 
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"{REDIS_URL}/1",
+        "OPTIONS": {
+            "socket_connect_timeout": 0.5,
+            "socket_timeout": 0.5,
+        },
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'apps.utils.CustomAuthenticated',
@@ -180,12 +194,61 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Profile resolution cache for CustomAuthenticated (seconds / entries)
+PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", 300))
+PROFILE_LOCAL_CACHE_TTL = int(os.environ.get("PROFILE_LOCAL_CACHE_TTL", 60))
+PROFILE_CACHE_MAXSIZE = int(os.environ.get("PROFILE_CACHE_MAXSIZE", 10000))
+
+# In-process cache of the Reaction catalog (seconds / entries)
+REACTION_CATALOG_TTL = int(os.environ.get("REACTION_CATALOG_TTL", 3600))
+REACTION_CATALOG_MAXSIZE = int(os.environ.get("REACTION_CATALOG_MAXSIZE", 1024))
+
+# Redis hashes holding per-profile unread counters, rebuilt from InboxEntry when evicted
+UNREAD_REDIS_URL = os.environ.get("UNREAD_REDIS_URL", f"{REDIS_URL}/2")
+UNREAD_COUNTER_TTL = int(os.environ.get("UNREAD_COUNTER_TTL", 7 * 24 * 3600))
+
+# Messages older than this are moved to MessageArchive by `manage.py archive_messages`
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.environ.get("MESSAGE_ARCHIVE_AFTER_DAYS", 180))
+
+# Seconds a send with a client_message_id is answered from Redis on retry
+MESSAGE_DEDUPE_TTL = int(os.environ.get("MESSAGE_DEDUPE_TTL", 300))
+
+# Limits of `message/<id>/thread/` (reply levels / messages per response)
+THREAD_MAX_DEPTH = int(os.environ.get("THREAD_MAX_DEPTH", 20))
+THREAD_MAX_SIZE = int(os.environ.get("THREAD_MAX_SIZE", 500))
+
+# Text search configuration of the generated apps_message.search_vector column
+MESSAGE_SEARCH_CONFIG = os.environ.get("MESSAGE_SEARCH_CONFIG", "english")
+
+# Change sequence served by `sync/`: rows older than the retention are pruned daily
+SYNC_CHANGELOG_RETENTION_DAYS = int(os.environ.get("SYNC_CHANGELOG_RETENTION_DAYS", 30))
+
+# Publish new messages to the channel layer from the request once the send
+# commits; Celery is then only used for recipients the publish failed for.
+REALTIME_INLINE_PUBLISH = os.environ.get("REALTIME_INLINE_PUBLISH", "true").lower() == "true"
+
+# Message fan-out: concurrent group_sends per chunk, and the largest room
+# (in listeners) still published from the request instead of a Celery task
+FANOUT_CHUNK_SIZE = int(os.environ.get("FANOUT_CHUNK_SIZE", 500))
+FANOUT_INLINE_MAX = int(os.environ.get("FANOUT_INLINE_MAX", 200))
+
+# Websocket clients connecting with `?batch=1` get their events as JSON arrays,
+# flushed after SOCKET_BATCH_WINDOW_MS or SOCKET_BATCH_MAX_EVENTS events;
+# channel-layer event types in SOCKET_BATCH_BYPASS are always sent right away
+SOCKET_BATCH_WINDOW_MS = int(os.environ.get("SOCKET_BATCH_WINDOW_MS", 20))
+SOCKET_BATCH_MAX_EVENTS = int(os.environ.get("SOCKET_BATCH_MAX_EVENTS", 50))
+SOCKET_BATCH_BYPASS = set(filter(None, os.environ.get("SOCKET_BATCH_BYPASS", "receive_typing").split(",")))
+
 # Celery settings
 CELERY_BROKER_URL = 'redis://redis:6379/0'  # Redis as a message broker
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 CELERY_BEAT_SCHEDULE = {
+    'prune_changelog': {
+        'task': 'apps.celery_tasks.tasks.prune_changelog',
+        'schedule': 24 * 3600,
+    },
     # 'sync_profiles': {
     #     'task': 'apps.celery_tasks.tasks.sync_all_profiles',
     #     'schedule': 10,
@@ -209,6 +272,20 @@ STATIC_URL = "https://%s/%s/" % (AWS_S3_CUSTOM_DOMAIN, AWS_LOCATION)
 DEFAULT_FILE_STORAGE = 'apps.media_storage.MediaStorage'
 BASE_URL = os.environ.get('BASE_URL', "")
 
+# Micro-service HTTP client (services.micro.client)
+# Timeouts are (connect, read) seconds keyed by endpoint path.
+MICRO_SERVICE_TIMEOUTS = {
+    "default": (3.05, 5),
+    "/api/user/get-profiles/": (3.05, 10),
+    "/api/user/current-profile/": (2, 3),
+}
+MICRO_SERVICE_RETRIES = int(os.environ.get("MICRO_SERVICE_RETRIES", 2))
+MICRO_SERVICE_RETRY_BACKOFF = float(os.environ.get("MICRO_SERVICE_RETRY_BACKOFF", 0.1))
+MICRO_SERVICE_BREAKER_THRESHOLD = int(os.environ.get("MICRO_SERVICE_BREAKER_THRESHOLD", 5))
+MICRO_SERVICE_BREAKER_RESET = float(os.environ.get("MICRO_SERVICE_BREAKER_RESET", 30))
+MICRO_SERVICE_POOL_CONNECTIONS = 10
+MICRO_SERVICE_POOL_MAXSIZE = int(os.environ.get("MICRO_SERVICE_POOL_MAXSIZE", 50))
+
 #### Logs ####
 # Ensure the directory for logs exists
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
@@ -1 +1 @@
-from .micro import UserService
\ No newline at end of file
+from .micro import UserService, AsyncUserService
\ No newline at end of file
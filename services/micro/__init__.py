@@ -1 +1 @@
-from .users.users import UserService
\ No newline at end of file
+from .users.users import UserService, AsyncUserService
\ No newline at end of file
@@ -0,0 +1,293 @@
+import os
+import time
+import random
+import logging
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUSES = {502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while an upstream's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+        Fails fast after `failure_threshold` consecutive failures.
+
+        Once `reset_timeout` seconds have passed a single trial call is let
+        through (half-open); its outcome closes or re-opens the circuit.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    log.warning(f"Circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class LatencyStats:
+    """Per-endpoint call counters and latencies (in milliseconds) for this process."""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, elapsed_ms: float, ok: bool) -> None:
+        with self._lock:
+            stats = self._data.setdefault(
+                endpoint, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            stats["count"] += 1
+            stats["errors"] += 0 if ok else 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                endpoint: {**stats, "avg_ms": stats["total_ms"] / stats["count"]}
+                for endpoint, stats in self._data.items()
+            }
+
+
+metrics = LatencyStats()
+
+_local = {"pid": None, "session": None}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the keep-alive session of the current process, rebuilding it after a fork."""
+    with _lock:
+        if _local["pid"] != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.MICRO_SERVICE_POOL_CONNECTIONS,
+                pool_maxsize=settings.MICRO_SERVICE_POOL_MAXSIZE,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _local["pid"], _local["session"] = os.getpid(), session
+        return _local["session"]
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the keep-alive httpx client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.MICRO_SERVICE_POOL_MAXSIZE,
+                max_keepalive_connections=settings.MICRO_SERVICE_POOL_MAXSIZE,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def get_breaker(service: str, base_url: str) -> CircuitBreaker:
+    """Returns the circuit breaker of one service at one base url, so services sharing a host trip apart."""
+    key = (service, base_url)
+    with _lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(
+                failure_threshold=settings.MICRO_SERVICE_BREAKER_THRESHOLD,
+                reset_timeout=settings.MICRO_SERVICE_BREAKER_RESET,
+            )
+        return _breakers[key]
+
+
+def get_timeout(endpoint: str) -> Tuple[float, float]:
+    timeouts = settings.MICRO_SERVICE_TIMEOUTS
+    return tuple(timeouts.get(endpoint, timeouts["default"]))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    base = settings.MICRO_SERVICE_RETRY_BACKOFF * (2 ** attempt)
+    return random.uniform(0, base)
+
+
+class ServiceClient:
+    """
+        Shared HTTP client for the micro-services.
+
+        Every call goes through the process-wide pooled session, uses the
+        timeout configured for its endpoint, is retried with jittered backoff
+        when it is safe to do so and is guarded by a per-service circuit
+        breaker.
+
+        Args:
+            service (str): Name of the upstream service, keys the circuit breaker
+                together with the base url.
+            base_url (str): Upstream root URL, defaults to `settings.BASE_URL`.
+            headers (Dict[str, str]): Headers sent with every call.
+    """
+
+    def __init__(self, service: str, base_url: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+        self.service = service
+        self.base_url = settings.BASE_URL if base_url is None else base_url
+        self.headers = headers or {}
+        self.breaker = get_breaker(self.service, self.base_url)
+
+    def request(self, method: str, endpoint: str, retry: Optional[bool] = None, **kwargs: Any) -> requests.Response:
+        """
+            Args:
+                method (str): HTTP method.
+                endpoint (str): Path appended to the base url, also the key for
+                    timeouts and metrics.
+                retry (bool): Whether failed calls may be retried; defaults to
+                    True for idempotent methods only.
+                **kwargs: Passed through to `requests.Session.request`.
+            Returns:
+                requests.Response: The upstream response, whatever its status.
+        """
+        method = method.upper()
+        retry = method in IDEMPOTENT_METHODS if retry is None else retry
+        attempts = 1 + (settings.MICRO_SERVICE_RETRIES if retry else 0)
+        kwargs.setdefault("timeout", get_timeout(endpoint))
+        kwargs["headers"] = {**self.headers, **kwargs.get("headers", {})}
+        url = self.base_url + endpoint
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {self.service} at {self.base_url}, skipping {endpoint}")
+
+            start = time.perf_counter()
+            try:
+                response = get_session().request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.record(endpoint, (time.perf_counter() - start) * 1000, ok=False)
+                self.breaker.record_failure()
+                log.warning(f"{method} {endpoint} failed (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 == attempts:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            except BaseException:
+                # Any other error (bad body encoding, cancellation...) still ends
+                # the attempt, otherwise a half-open trial would never resolve.
+                metrics.record(endpoint, (time.perf_counter() - start) * 1000, ok=False)
+                self.breaker.record_failure()
+                raise
+
+            failed = response.status_code >= 500
+            metrics.record(endpoint, (time.perf_counter() - start) * 1000, ok=not failed)
+            if failed:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                time.sleep(backoff_delay(attempt))
+                continue
+            return response
+
+    def get(self, endpoint: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", endpoint, **kwargs)
+
+
+class AsyncServiceClient(ServiceClient):
+    """
+        asyncio counterpart of `ServiceClient`.
+
+        Calls are made with a pooled `httpx.AsyncClient` per event loop so
+        waiting on an upstream never holds a thread. Timeouts, retries, the
+        circuit breaker and metrics are shared with the sync client.
+    """
+
+    async def request(self, method: str, endpoint: str, retry: Optional[bool] = None, **kwargs: Any) -> httpx.Response:
+        method = method.upper()
+        retry = method in IDEMPOTENT_METHODS if retry is None else retry
+        attempts = 1 + (settings.MICRO_SERVICE_RETRIES if retry else 0)
+        if "timeout" not in kwargs:
+            connect, read = get_timeout(endpoint)
+            kwargs["timeout"] = httpx.Timeout(read, connect=connect)
+        kwargs["headers"] = {
+            key: value
+            for key, value in {**self.headers, **kwargs.get("headers", {})}.items()
+            if value is not None
+        }
+        url = self.base_url + endpoint
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {self.service} at {self.base_url}, skipping {endpoint}")
+
+            start = time.perf_counter()
+            try:
+                response = await get_async_client().request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                metrics.record(endpoint, (time.perf_counter() - start) * 1000, ok=False)
+                self.breaker.record_failure()
+                log.warning(f"{method} {endpoint} failed (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 == attempts:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            except BaseException:
+                metrics.record(endpoint, (time.perf_counter() - start) * 1000, ok=False)
+                self.breaker.record_failure()
+                raise
+
+            failed = response.status_code >= 500
+            metrics.record(endpoint, (time.perf_counter() - start) * 1000, ok=not failed)
+            if failed:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            return response
+
+    async def get(self, endpoint: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", endpoint, **kwargs)
+
+    async def post(self, endpoint: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", endpoint, **kwargs)
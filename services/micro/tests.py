@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import requests
+from django.test import SimpleTestCase
+
+from services.micro.client import AsyncServiceClient, CircuitBreaker, ServiceClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """`/ok` answers 200, `/garbled` claims a gzip body it doesn't have."""
+
+    def do_GET(self):
+        body = b'{"ok": true}' if self.path == "/ok" else b"not gzip at all"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if self.path == "/garbled":
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HalfOpenTrialTests(SimpleTestCase):
+    """Every half-open trial must close or re-open the circuit, whatever it raises."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def trip(self, client: ServiceClient) -> None:
+        """Opens the client's circuit with the reset timeout already passed."""
+        client.breaker.state = CircuitBreaker.OPEN
+        client.breaker.opened_at = time.monotonic() - client.breaker.reset_timeout
+
+    def test_unexpected_error_reopens_circuit(self):
+        client = ServiceClient("stub", base_url=self.base_url)
+        self.trip(client)
+        with self.assertRaises(requests.exceptions.ContentDecodingError):
+            client.get("/garbled")
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+        self.trip(client)
+        self.assertEqual(client.get("/ok").status_code, 200)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_async_unexpected_error_reopens_circuit(self):
+        client = AsyncServiceClient("stub", base_url=self.base_url)
+        self.trip(client)
+        with self.assertRaises(httpx.DecodingError):
+            asyncio.run(client.get("/garbled"))
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+    def test_async_cancelled_trial_reopens_circuit(self):
+        client = AsyncServiceClient("stub", base_url=self.base_url)
+        self.trip(client)
+
+        async def cancelled():
+            task = asyncio.ensure_future(client.get("/ok"))
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancelled())
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+
+class BreakerKeyTests(SimpleTestCase):
+    """Services on the same base url trip their own circuits."""
+
+    def test_services_on_one_base_url_have_separate_breakers(self):
+        users = ServiceClient("users", base_url="http://shared.invalid")
+        interactions = ServiceClient("interactions", base_url="http://shared.invalid")
+        self.assertIsNot(users.breaker, interactions.breaker)
+        self.assertIs(AsyncServiceClient("users", base_url="http://shared.invalid").breaker, users.breaker)
+
+        interactions.breaker.state = CircuitBreaker.OPEN
+        interactions.breaker.opened_at = time.monotonic()
+        self.assertTrue(users.breaker.allow())
@@ -1,19 +1,18 @@
-
 import requests
 import uuid 
 import logging
-from django.conf import settings
 from typing import List, Optional, Set, Any, Dict
+from services.micro.client import ServiceClient, AsyncServiceClient
 
 log = logging.getLogger(__name__)
 
-base_url = settings.BASE_URL
 class UserService:
 
-    def __init__(self, auth_token: str):
+    def __init__(self, auth_token: str, base_url: Optional[str] = None):
         self.headers = {
             "Authorization": f"Bearer {auth_token}"
         }
+        self.client = ServiceClient("users", base_url=base_url, headers=self.headers)
 
     def get_user(self, user_id: uuid):
         try:
@@ -21,7 +20,7 @@ class UserService:
                     "email": "admin@admin.com",
                     "password": "admin"
                 }
-            response = requests.post(f"{self.base_url}/core/login/", data, timeout=5)
+            response = self.client.post("/core/login/", data=data, headers={"Authorization": None})
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -34,9 +33,7 @@ class UserService:
             data = {
                     "profile_ids": ids
                 }
-            print(data)
-            url = base_url + endpoint
-            response = requests.post(url, headers=self.headers, json=data)
+            response = self.client.post(endpoint, json=data, retry=True)
             return response.json()
         except Exception as e:
             log.error(str(e))
@@ -45,10 +42,7 @@ class UserService:
     def get_current_user(self) -> requests.Response:
         try:
             endpoint = "/api/user/current-profile/"
-            url = base_url + endpoint
-            response = requests.get(url, headers=self.headers)
-            return response
-        
+            return self.client.get(endpoint)
         except Exception as e:
             log.error(str(e))
             raise
@@ -56,10 +50,35 @@ class UserService:
     def get_all_users(self):
         try:
             endpoint = "/api/user/getallusers/"
-            url = base_url + endpoint 
-            print(url)
-            response = requests.get(url, headers=self.headers)
+            response = self.client.get(endpoint)
             return response.json()
         except requests.exceptions.RequestException as e:
             log.error(f"Failed to fetch all users: {e}")
             raise
+
+
+class AsyncUserService:
+    """asyncio variant of `UserService` for callers running on an event loop."""
+
+    def __init__(self, auth_token: str, base_url: Optional[str] = None):
+        self.headers = {
+            "Authorization": f"Bearer {auth_token}"
+        }
+        self.client = AsyncServiceClient("users", base_url=base_url, headers=self.headers)
+
+    async def get_profiles_by_ids(self, ids: List[int]) -> List[Dict[str, str]]:
+        try:
+            endpoint = "/api/user/get-profiles/"
+            response = await self.client.post(endpoint, json={"profile_ids": ids}, retry=True)
+            return response.json()
+        except Exception as e:
+            log.error(str(e))
+            raise
+
+    async def get_current_user(self):
+        try:
+            endpoint = "/api/user/current-profile/"
+            return await self.client.get(endpoint)
+        except Exception as e:
+            log.error(str(e))
+            raise
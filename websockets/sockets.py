@@ -1,21 +1,37 @@
 
+import asyncio
 import json
 import logging
 import urllib.parse
 import datetime
+from django.conf import settings
 from django.utils.dateformat import format
 from channels.generic.websocket import WebsocketConsumer, AsyncWebsocketConsumer
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from channels.layers import get_channel_layer
 
 from channels.db import database_sync_to_async
-from apps.models import Profile, Message, Conversation
-from apps.repositories import ProfileRepo
+from apps.models import Profile, Message, Conversation, InboxEntry
+from apps.utils.permissions.tokens import aresolve_profile
+from apps.repositories import UnreadCounter
 
 log = logging.getLogger("apps")
 log.error("="*100)
 
 class SocketConsumer(AsyncWebsocketConsumer):
+    """
+        Realtime events of one profile.
+
+        Every event is one frame unless the client connects with `?batch=1`;
+        then events are buffered and flushed as one JSON array frame once
+        SOCKET_BATCH_MAX_EVENTS are pending or SOCKET_BATCH_WINDOW_MS have
+        passed since the first of them. Event types in SOCKET_BATCH_BYPASS
+        flush what is pending and go out on their own, so order is kept.
+    """
+    batching = False
+    flush_handle = None
+    flush_task = None
+
     async def token_parser(self):
         raw_query = self.scope["query_string"]
         decoded_query = raw_query.decode("utf-8")
@@ -23,10 +39,61 @@ class SocketConsumer(AsyncWebsocketConsumer):
         token = query_params.get("token", [None])[0]
         return token
 
+    def wants_batching(self) -> bool:
+        query_params = urllib.parse.parse_qs(self.scope["query_string"].decode("utf-8"))
+        return query_params.get("batch", ["0"])[0] in ("1", "true") and settings.SOCKET_BATCH_WINDOW_MS > 0
+
+    async def emit(self, event_type: str, payload):
+        """
+            Sends `payload` to the client, or queues it for the next batch frame.
+
+            Args:
+                event_type (str): Channel-layer type of the event, checked against SOCKET_BATCH_BYPASS.
+                payload: JSON serializable frame content.
+        """
+        if not self.batching or event_type in settings.SOCKET_BATCH_BYPASS:
+            await self.flush()
+            await self.send(text_data=json.dumps(payload))
+            return
+        self.outbox.append(payload)
+        if len(self.outbox) >= settings.SOCKET_BATCH_MAX_EVENTS:
+            await self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                settings.SOCKET_BATCH_WINDOW_MS / 1000, self.start_flush,
+            )
+
+    def start_flush(self):
+        """Timer callback: flushes in a task kept on the consumer so its errors are logged."""
+        self.flush_handle = None
+        self.flush_task = asyncio.ensure_future(self.flush())
+        self.flush_task.add_done_callback(self.flush_done)
+
+    def flush_done(self, task):
+        if task is self.flush_task:
+            self.flush_task = None
+        if not task.cancelled() and task.exception() is not None:
+            log.error(f"Batched frame flush for {self.channel_name} failed: {task.exception()!r}")
+
+    async def flush(self):
+        """Sends the pending events as one array frame."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.batching or not self.outbox:
+            return
+        pending, self.outbox = self.outbox, []
+        await self.send(text_data=json.dumps(pending))
+
     async def update_status(self, status):
+        # self.user may be a cached copy: only write the presence columns, so
+        # profile changes made meanwhile by another worker aren't reverted.
         self.user.is_online = status
         self.user.last_seen = datetime.datetime.now() if not status else None
-        await database_sync_to_async(self.user.save)()
+        await Profile.objects.filter(pk=self.user.pk).aupdate(
+            is_online=self.user.is_online,
+            last_seen=self.user.last_seen,
+        )
             
     @database_sync_to_async
     def get_user_by_id(self, id: str):
@@ -34,10 +101,8 @@ class SocketConsumer(AsyncWebsocketConsumer):
         user = None
         return user
 
-    @database_sync_to_async
-    def authenticate_user(self, token):
-        repo = ProfileRepo(token)
-        self.user = repo.verify_user_by_token()
+    async def authenticate_user(self, token):
+        self.user = await aresolve_profile(token)
         self.scope["user"] = self.user
         return self.user
 
@@ -53,9 +118,8 @@ class SocketConsumer(AsyncWebsocketConsumer):
         if con:
             log.error("Error 2")
             
-            messages = con.messages.filter(is_read=False).exclude(sender__id=self.user.id)
-            print(messages)
-            messages.update(is_read=True)
+            InboxEntry.mark_read(con.id, self.user.id)
+            UnreadCounter().reset(self.user.id, con.id)
 
     async def connect(self):
         await self.accept()
@@ -68,6 +132,8 @@ class SocketConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
+        self.batching = self.wants_batching()
+        self.outbox = []
 
         self.chat_group = f"chat_{str(self.user.id)}"
         self.room_group_name = f"chat_{str(self.user.id)}"
@@ -85,21 +151,25 @@ class SocketConsumer(AsyncWebsocketConsumer):
             self.room_group_name, data
         )
     async def parser(self, event):
-        await self.send(text_data=json.dumps({
+        await self.emit(event["type"], {
             'data': event['message']
-        }))
+        })
         
+    async def reaction(self, event):
+        await self.emit(event["type"], {
+            "type": "reaction",
+            "data": event["message"],
+        })
+
     async def seen(self, event):
 
-        await self.send(text_data=json.dumps(
-            event
-        ))
+        await self.emit(event["type"], event)
     async def receive_typing(self, event): 
 
-        await self.send(text_data=json.dumps({
+        await self.emit(event["type"], {
             "type": "typing",
             'message': event['message']
-        }))
+        })
         
     async def typing(self, event):
         op_id = event["op_id"]
@@ -123,7 +193,19 @@ class SocketConsumer(AsyncWebsocketConsumer):
             }
         )
 
+    async def close(self, code=None, reason=None):
+        # Send what is still batched before the server closes the socket.
+        await self.flush()
+        await super().close(code, reason)
+
     async def disconnect(self, close_code):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        # The client is gone, events still batched can't be delivered anymore.
+        if self.batching and self.outbox:
+            log.info(f"Socket {self.channel_name} closed with {len(self.outbox)} batched events unsent")
+            self.outbox = []
         # await self.update_status(False)
         print("OKAy")
         await self.channel_layer.group_send(